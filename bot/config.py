@@ -4,79 +4,173 @@ Loads and validates all required environment variables.
 """
 
 import os
-from typing import List
-from dotenv import load_dotenv
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import FrozenSet, Mapping, Optional, Tuple
 
-# Load environment variables from .env file if present
-load_dotenv()
+_ENV_LOADED = False
 
+# Lookup tables for address / private key validation
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+_ADDRESS_LENGTH = 42
+_PRIVATE_KEY_LENGTH = 64
 
+# Directories already ensured by _validate_path in this process
+_MKDIR_CACHE: set = set()
+
+
+def _load_env_once() -> None:
+    """Load variables from a .env file (if present) the first time config is built."""
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _ENV_LOADED = True
+
+
+@dataclass(frozen=True, slots=True)
 class Config:
-    """Global configuration loaded from environment variables."""
+    """Global configuration loaded from environment variables (immutable)."""
+    
+    # Blockchain & DEX configuration
+    RPC_URL: str
+    WALLET_PRIVATE_KEY: str
+    DEX_ROUTER_ADDRESS: str
+    BASE_TOKEN_ADDRESS: str
+    QUOTE_TOKEN_ADDRESS: str
+    
+    # Telegram configuration
+    TELEGRAM_BOT_TOKEN: str
+    ALLOWED_TELEGRAM_IDS: FrozenSet[int]
+    WEBHOOK_URL: Optional[str]  # None = long polling
+    WEBHOOK_PORT: int  # local port the webhook server listens on
+    
+    # Optional configuration
+    DATABASE_PATH: str
+    LOG_LEVEL: str
+    MAX_TRADES_PER_SESSION: int
+    
+    # Gas configuration
+    GAS_PRICE_GWEI: Optional[str]  # None = use network default
+    GAS_LIMIT: int
+    
+    # RPC configuration
+    RPC_TIMEOUT: int
+    RPC_MAX_RETRIES: int
+    RPC_POOL_SIZE: int  # keep-alive connections to the RPC endpoint
+    RPC_URLS: Tuple[str, ...]  # alternate endpoints, ranked against RPC_URL at startup
+    RPC_HTTP2: bool  # multiplex RPC calls over HTTP/2 (needs the h2 package)
+    PRIVATE_RELAY_URL: Optional[str]  # None = broadcast swaps via RPC_URL
+    
+    # Logging configuration
+    LOG_FILE_PATH: str
+    ENABLE_LOG_ROTATION: bool
+    MAX_LOG_SIZE_MB: int
+    LOG_BACKUP_COUNT: int
+    
+    # On-disk cache (token allowances)
+    CACHE_DIR: str
+    ALLOWANCE_CACHE_TTL: int  # seconds before a cached allowance is re-read on-chain
     
-    def __init__(self):
-        """Initialize and validate all required configuration values."""
+    # Rate limiting (commands per minute per user)
+    RATE_LIMIT_PER_MINUTE: int
+    RATE_LIMIT_SINGLE_USER: bool  # also rate-limit when only one Telegram ID is allowed
+    
+    @classmethod
+    def from_env(
+        cls,
+        env: Optional[Mapping[str, str]] = None,
+        create_dirs: bool = True
+    ) -> "Config":
+        """
+        Read, validate and freeze all configuration values.
+        
+        Args:
+            env: Values to read instead of the process environment
+            create_dirs: Create the database directory if it is missing;
+                pass False to validate without touching the filesystem
+        """
+        # Snapshot the environment once; every key below is read from it
+        if env is None:
+            _load_env_once()
+            env = os.environ
+        env = dict(env)
         
         # Blockchain & DEX configuration
-        self.RPC_URL = self._require_env("RPC_URL")
-        self.WALLET_PRIVATE_KEY = self._require_env("WALLET_PRIVATE_KEY")
-        self.DEX_ROUTER_ADDRESS = self._require_env("DEX_ROUTER_ADDRESS")
-        self.BASE_TOKEN_ADDRESS = self._require_env("BASE_TOKEN_ADDRESS")
-        self.QUOTE_TOKEN_ADDRESS = self._require_env("QUOTE_TOKEN_ADDRESS")
+        rpc_url = cls._require_env(env, "RPC_URL")
+        wallet_private_key = cls._require_env(env, "WALLET_PRIVATE_KEY")
+        dex_router_address = cls._require_env(env, "DEX_ROUTER_ADDRESS")
+        base_token_address = cls._require_env(env, "BASE_TOKEN_ADDRESS")
+        quote_token_address = cls._require_env(env, "QUOTE_TOKEN_ADDRESS")
         
         # Telegram configuration
-        self.TELEGRAM_BOT_TOKEN = self._require_env("TELEGRAM_BOT_TOKEN")
-        self.ALLOWED_TELEGRAM_IDS = self._parse_allowed_ids(
-            self._require_env("ALLOWED_TELEGRAM_IDS")
+        telegram_bot_token = cls._require_env(env, "TELEGRAM_BOT_TOKEN")
+        allowed_telegram_ids = cls._parse_allowed_ids(
+            cls._require_env(env, "ALLOWED_TELEGRAM_IDS")
         )
         
         # Optional configuration with defaults
-        self.DATABASE_PATH = os.getenv("DATABASE_PATH", "bot_data.db")
-        self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
-        self.MAX_TRADES_PER_SESSION = int(os.getenv("MAX_TRADES_PER_SESSION", "1000"))
-        
-        # Gas configuration (optional)
-        self.GAS_PRICE_GWEI = os.getenv("GAS_PRICE_GWEI")  # None = use network default
-        self.GAS_LIMIT = int(os.getenv("GAS_LIMIT", "300000"))
-        
-        # RPC configuration
-        self.RPC_TIMEOUT = int(os.getenv("RPC_TIMEOUT", "30"))
-        self.RPC_MAX_RETRIES = int(os.getenv("RPC_MAX_RETRIES", "3"))
-        
-        # Logging configuration
-        self.LOG_FILE_PATH = os.getenv("LOG_FILE_PATH", "bot.log")
-        self.ENABLE_LOG_ROTATION = os.getenv("ENABLE_LOG_ROTATION", "true").lower() == "true"
-        self.MAX_LOG_SIZE_MB = int(os.getenv("MAX_LOG_SIZE_MB", "10"))
-        self.LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
-        
-        # Rate limiting (commands per minute per user)
-        self.RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+        database_path = env.get("DATABASE_PATH", "bot_data.db")
+        log_file_path = env.get("LOG_FILE_PATH", "bot.log")
         
         # Validate addresses
-        self._validate_address(self.DEX_ROUTER_ADDRESS, "DEX_ROUTER_ADDRESS")
-        self._validate_address(self.BASE_TOKEN_ADDRESS, "BASE_TOKEN_ADDRESS")
-        self._validate_address(self.QUOTE_TOKEN_ADDRESS, "QUOTE_TOKEN_ADDRESS")
+        cls._validate_address(dex_router_address, "DEX_ROUTER_ADDRESS")
+        cls._validate_address(base_token_address, "BASE_TOKEN_ADDRESS")
+        cls._validate_address(quote_token_address, "QUOTE_TOKEN_ADDRESS")
         
         # Validate private key format
-        self._validate_private_key(self.WALLET_PRIVATE_KEY)
+        cls._validate_private_key(wallet_private_key)
         
         # Validate paths
-        self._validate_path(self.DATABASE_PATH, "DATABASE_PATH")
-        self._validate_path(self.LOG_FILE_PATH, "LOG_FILE_PATH")
+        cls._validate_path(database_path, "DATABASE_PATH", create_dirs)
+        cls._validate_path(log_file_path, "LOG_FILE_PATH", create_dirs)
+        
+        return cls(
+            RPC_URL=rpc_url,
+            WALLET_PRIVATE_KEY=wallet_private_key,
+            DEX_ROUTER_ADDRESS=dex_router_address,
+            BASE_TOKEN_ADDRESS=base_token_address,
+            QUOTE_TOKEN_ADDRESS=quote_token_address,
+            TELEGRAM_BOT_TOKEN=telegram_bot_token,
+            ALLOWED_TELEGRAM_IDS=allowed_telegram_ids,
+            WEBHOOK_URL=env.get("WEBHOOK_URL") or None,
+            WEBHOOK_PORT=int(env.get("WEBHOOK_PORT", "8443")),
+            DATABASE_PATH=database_path,
+            LOG_LEVEL=env.get("LOG_LEVEL", "INFO"),
+            MAX_TRADES_PER_SESSION=int(env.get("MAX_TRADES_PER_SESSION", "1000")),
+            GAS_PRICE_GWEI=env.get("GAS_PRICE_GWEI"),
+            GAS_LIMIT=int(env.get("GAS_LIMIT", "300000")),
+            RPC_TIMEOUT=int(env.get("RPC_TIMEOUT", "30")),
+            RPC_MAX_RETRIES=int(env.get("RPC_MAX_RETRIES", "3")),
+            RPC_POOL_SIZE=int(env.get("RPC_POOL_SIZE", "20")),
+            RPC_URLS=tuple(
+                url.strip() for url in env.get("RPC_URLS", "").split(",") if url.strip()
+            ),
+            RPC_HTTP2=env.get("RPC_HTTP2", "false").lower() == "true",
+            PRIVATE_RELAY_URL=env.get("PRIVATE_RELAY_URL") or None,
+            LOG_FILE_PATH=log_file_path,
+            ENABLE_LOG_ROTATION=env.get("ENABLE_LOG_ROTATION", "true").lower() == "true",
+            MAX_LOG_SIZE_MB=int(env.get("MAX_LOG_SIZE_MB", "10")),
+            LOG_BACKUP_COUNT=int(env.get("LOG_BACKUP_COUNT", "5")),
+            CACHE_DIR=os.path.expanduser(env.get("CACHE_DIR", "~/.cache/telegrambot")),
+            ALLOWANCE_CACHE_TTL=int(env.get("ALLOWANCE_CACHE_TTL", "3600")),
+            RATE_LIMIT_PER_MINUTE=int(env.get("RATE_LIMIT_PER_MINUTE", "30")),
+            RATE_LIMIT_SINGLE_USER=env.get("RATE_LIMIT_SINGLE_USER", "false").lower() == "true",
+        )
     
     @staticmethod
-    def _require_env(key: str) -> str:
+    def _require_env(env: Mapping[str, str], key: str) -> str:
         """Get required environment variable or raise error."""
-        value = os.getenv(key)
+        value = env.get(key)
         if not value:
             raise ValueError(f"Required environment variable '{key}' is not set")
         return value
     
     @staticmethod
-    def _parse_allowed_ids(ids_str: str) -> List[int]:
+    def _parse_allowed_ids(ids_str: str) -> FrozenSet[int]:
         """Parse comma-separated list of Telegram user IDs."""
         try:
-            ids = [int(id_str.strip()) for id_str in ids_str.split(",") if id_str.strip()]
+            ids = frozenset(int(id_str) for id_str in ids_str.split(",") if id_str.strip())
             if not ids:
                 raise ValueError("ALLOWED_TELEGRAM_IDS must contain at least one ID")
             return ids
@@ -86,7 +180,11 @@ class Config:
     @staticmethod
     def _validate_address(address: str, name: str) -> None:
         """Validate Ethereum address format."""
-        if not address.startswith("0x") or len(address) != 42:
+        if (
+            not address.startswith("0x")
+            or len(address) != _ADDRESS_LENGTH
+            or not _HEX_DIGITS.issuperset(address[2:])
+        ):
             raise ValueError(
                 f"{name} must be a valid Ethereum address (0x + 40 hex chars)"
             )
@@ -96,15 +194,13 @@ class Config:
         """Validate private key format."""
         # Remove 0x prefix if present
         key = private_key.replace("0x", "")
-        if len(key) != 64:
+        if len(key) != _PRIVATE_KEY_LENGTH:
             raise ValueError("WALLET_PRIVATE_KEY must be 64 hex characters (with or without 0x prefix)")
-        try:
-            int(key, 16)
-        except ValueError:
+        if not _HEX_DIGITS.issuperset(key):
             raise ValueError("WALLET_PRIVATE_KEY must contain only hexadecimal characters")
     
     @staticmethod
-    def _validate_path(path: str, name: str) -> None:
+    def _validate_path(path: str, name: str, create_dirs: bool = True) -> None:
         """Validate file path is safe and doesn't contain directory traversal."""
         if not path:
             raise ValueError(f"{name} cannot be empty")
@@ -113,19 +209,28 @@ class Config:
             # Allow absolute paths but warn - in production, consider restricting
             pass
         # Ensure parent directory exists for database
-        if name == "DATABASE_PATH":
-            import os
+        if name == "DATABASE_PATH" and create_dirs:
             db_dir = os.path.dirname(path) or "."
-            if not os.path.exists(db_dir):
+            if db_dir not in _MKDIR_CACHE:
                 try:
                     os.makedirs(db_dir, exist_ok=True)
                 except Exception as e:
                     raise ValueError(f"Cannot create directory for {name}: {e}")
+                _MKDIR_CACHE.add(db_dir)
     
     def is_authorized_user(self, user_id: int) -> bool:
         """Check if a Telegram user ID is authorized to use the bot."""
         return user_id in self.ALLOWED_TELEGRAM_IDS
 
 
-# Global config instance
-config = Config()
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Build the process-wide Config once and reuse it on later calls."""
+    return Config.from_env()
+
+
+def __getattr__(name: str):
+    """Resolve the global ``config`` instance lazily (PEP 562)."""
+    if name == "config":
+        return get_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,9 +4,13 @@ Manages session configuration, state, and trade history in SQLite.
 """
 
 import logging
-from typing import Optional, List
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional, List, Tuple
 from datetime import datetime
 from contextlib import contextmanager
+from dataclasses import replace
 
 from sqlalchemy import (
     create_engine,
@@ -15,19 +19,48 @@ from sqlalchemy import (
     Float,
     String,
     Boolean,
+    Table,
     DateTime,
     ForeignKey,
+    Index,
+    bindparam,
+    event,
+    func,
+    insert,
+    select,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 from sqlalchemy.exc import SQLAlchemyError
 
-from .models import SessionConfig, SessionState, TradeRecord
+from .models import SessionConfig, SessionState, TradeRecord, utcnow
 
 logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
 
+# Applied to every new SQLite connection: WAL lets readers run alongside the
+# writer and, with synchronous=NORMAL, avoids an fsync on every commit.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Configure a freshly opened SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
 # SQLAlchemy ORM Models
 
 class SessionConfigDB(Base):
@@ -41,8 +74,8 @@ class SessionConfigDB(Base):
     slippage_bps = Column(Integer, default=50)
     min_notional = Column(Float, default=10.0)
     max_position = Column(Float, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
 
 class SessionStateDB(Base):
@@ -59,23 +92,120 @@ class SessionStateDB(Base):
     started_at = Column(DateTime, nullable=True)
     stopped_at = Column(DateTime, nullable=True)
     last_error = Column(String, nullable=True)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow)
 
 
-class TradeRecordDB(Base):
-    """Database model for TradeRecord."""
-    __tablename__ = "trade_records"
-    
-    id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, nullable=False, index=True)
-    side = Column(String(4), nullable=False)  # "BUY" or "SELL"
-    amount_in = Column(Float, nullable=False)
-    amount_out = Column(Float, nullable=False)
-    tx_hash = Column(String(66), nullable=False, unique=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
-    gas_used = Column(Integer, nullable=True)
-    gas_price_gwei = Column(Float, nullable=True)
-    execution_price = Column(Float, nullable=True)
+# Trade records are append-only and written once per trade, so they use a
+# plain Core table (no ORM instrumentation) mapped to/from TradeRecord directly.
+trade_records_table = Table(
+    "trade_records",
+    Base.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, nullable=False),
+    Column("side", String(4), nullable=False),  # "BUY" or "SELL"
+    Column("amount_in", Float, nullable=False),
+    Column("amount_out", Float, nullable=False),
+    Column("tx_hash", String(66), nullable=False, unique=True),
+    Column("timestamp", DateTime, default=utcnow),
+    Column("gas_used", Integer, nullable=True),
+    Column("gas_price_gwei", Float, nullable=True),
+    Column("execution_price", Float, nullable=True),
+)
+
+# Serves get_user_trades as a range scan in the requested order (no sort)
+Index(
+    "ix_trades_user_ts",
+    trade_records_table.c.user_id,
+    trade_records_table.c.timestamp.desc(),
+)
+
+
+# Columns selected for each dataclass; names match the dataclass fields so
+# rows map straight onto them without building ORM instances.
+SESSION_CONFIG_COLUMNS = (
+    SessionConfigDB.user_id,
+    SessionConfigDB.total_liquidity,
+    SessionConfigDB.trade_pct,
+    SessionConfigDB.interval_seconds,
+    SessionConfigDB.slippage_bps,
+    SessionConfigDB.min_notional,
+    SessionConfigDB.max_position,
+)
+
+SESSION_STATE_COLUMNS = (
+    SessionStateDB.user_id,
+    SessionStateDB.active,
+    SessionStateDB.trades_executed,
+    SessionStateDB.spent_notional,
+    SessionStateDB.received_quote,
+    SessionStateDB.base_position_delta,
+    SessionStateDB.pattern_index,
+    SessionStateDB.started_at,
+    SessionStateDB.stopped_at,
+    SessionStateDB.last_error,
+)
+
+TRADE_RECORD_COLUMNS = tuple(trade_records_table.c)
+
+
+def _build_upsert(model, columns):
+    """Build an INSERT ... ON CONFLICT(user_id) DO UPDATE for a per-user row."""
+    stmt = sqlite_insert(model)
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            column: stmt.excluded[column]
+            for column in columns
+            if column not in ("user_id", "created_at")
+        },
+    )
+
+
+# Statements are built once at import and executed with bound parameters,
+# so each call reuses the same compiled SQL instead of rebuilding it.
+_SELECT_SESSION_CONFIG = select(*SESSION_CONFIG_COLUMNS).where(
+    SessionConfigDB.user_id == bindparam("user_id")
+)
+
+_SELECT_SESSION_STATE = select(*SESSION_STATE_COLUMNS).where(
+    SessionStateDB.user_id == bindparam("user_id")
+)
+
+# Config and state in one round trip; columns are prefixed to keep user_id apart
+_SELECT_SESSION_BUNDLE = (
+    select(
+        *(column.label(f"config_{column.key}") for column in SESSION_CONFIG_COLUMNS),
+        *(column.label(f"state_{column.key}") for column in SESSION_STATE_COLUMNS),
+    )
+    .select_from(SessionConfigDB)
+    .outerjoin(SessionStateDB, SessionStateDB.user_id == SessionConfigDB.user_id)
+    .where(SessionConfigDB.user_id == bindparam("user_id"))
+)
+
+_SELECT_USER_TRADES = (
+    select(*TRADE_RECORD_COLUMNS)
+    .where(trade_records_table.c.user_id == bindparam("user_id"))
+    .order_by(trade_records_table.c.timestamp.desc())
+    .limit(bindparam("limit"))
+)
+
+_COUNT_USER_TRADES = (
+    select(func.count())
+    .select_from(trade_records_table)
+    .where(trade_records_table.c.user_id == bindparam("user_id"))
+)
+
+_UPSERT_SESSION_CONFIG = _build_upsert(
+    SessionConfigDB,
+    [column.name for column in SESSION_CONFIG_COLUMNS] + ["created_at", "updated_at"],
+)
+
+_UPSERT_SESSION_STATE = _build_upsert(
+    SessionStateDB,
+    [column.name for column in SESSION_STATE_COLUMNS] + ["updated_at"],
+)
+
+_INSERT_TRADE_RECORD = insert(trade_records_table)
 
 
 class Database:
@@ -89,12 +219,41 @@ class Database:
         self.engine = create_engine(
             f"sqlite:///{db_path}",
             echo=False,
-            connect_args={"check_same_thread": False}
+            connect_args={"check_same_thread": False},
+            query_cache_size=1200,
         )
+        event.listen(self.engine, "connect", _set_sqlite_pragmas)
         Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(bind=self.engine)
+        self._migrate_indexes()
+        # Every unit of work is short and results are copied into dataclasses
+        # before the session closes, so skip post-commit expiry and autoflush.
+        self.SessionLocal = sessionmaker(
+            bind=self.engine, expire_on_commit=False, autoflush=False
+        )
+        
+        # Write-through caches of per-user rows; every write goes through
+        # save_session_config/save_session_state, which refresh them.
+        # Callers get copies of states so they can mutate them freely;
+        # configs are frozen and shared as-is. The lock guards only the dicts,
+        # never database I/O, so cache hits don't wait behind a commit. Writes
+        # for one user are already serialized by their callers (the event loop
+        # for configs, the session runner's locks for states).
+        self._cache_lock = threading.Lock()
+        self._config_cache: Dict[int, SessionConfig] = {}
+        self._state_cache: Dict[int, SessionState] = {}
         logger.info(f"Database initialized at {db_path}")
     
+    def _migrate_indexes(self) -> None:
+        """Bring trade_records indexes of databases created by older versions up to date."""
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS ix_trades_user_ts "
+                "ON trade_records (user_id, timestamp DESC)"
+            )
+            # Superseded by ix_trades_user_ts
+            conn.exec_driver_sql("DROP INDEX IF EXISTS ix_trade_records_user_id")
+            conn.exec_driver_sql("DROP INDEX IF EXISTS ix_trade_records_timestamp")
+    
     @contextmanager
     def get_session(self):
         """Provide a transactional scope for database operations."""
@@ -113,184 +272,193 @@ class Database:
     
     def save_session_config(self, config: SessionConfig) -> None:
         """Save or update a user's session configuration."""
+        now = utcnow()
+        values = {
+            "user_id": config.user_id,
+            "total_liquidity": config.total_liquidity,
+            "trade_pct": config.trade_pct,
+            "interval_seconds": config.interval_seconds,
+            "slippage_bps": config.slippage_bps,
+            "min_notional": config.min_notional,
+            "max_position": config.max_position,
+            "created_at": now,
+            "updated_at": now,
+        }
         with self.get_session() as session:
-            db_config = session.query(SessionConfigDB).filter_by(
-                user_id=config.user_id
-            ).first()
-            
-            if db_config:
-                # Update existing
-                db_config.total_liquidity = config.total_liquidity
-                db_config.trade_pct = config.trade_pct
-                db_config.interval_seconds = config.interval_seconds
-                db_config.slippage_bps = config.slippage_bps
-                db_config.min_notional = config.min_notional
-                db_config.max_position = config.max_position
-                db_config.updated_at = datetime.utcnow()
-                logger.info(f"Updated session config for user {config.user_id}")
-            else:
-                # Create new
-                db_config = SessionConfigDB(
-                    user_id=config.user_id,
-                    total_liquidity=config.total_liquidity,
-                    trade_pct=config.trade_pct,
-                    interval_seconds=config.interval_seconds,
-                    slippage_bps=config.slippage_bps,
-                    min_notional=config.min_notional,
-                    max_position=config.max_position,
-                )
-                session.add(db_config)
-                logger.info(f"Created session config for user {config.user_id}")
+            session.execute(_UPSERT_SESSION_CONFIG, values)
+        with self._cache_lock:
+            self._config_cache[config.user_id] = config
+        logger.info(f"Saved session config for user {config.user_id}")
     
     def get_session_config(self, user_id: int) -> Optional[SessionConfig]:
         """Retrieve a user's session configuration."""
+        with self._cache_lock:
+            cached = self._config_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         with self.get_session() as session:
-            db_config = session.query(SessionConfigDB).filter_by(
-                user_id=user_id
-            ).first()
-            
-            if not db_config:
-                return None
-            
-            return SessionConfig(
-                user_id=db_config.user_id,
-                total_liquidity=db_config.total_liquidity,
-                trade_pct=db_config.trade_pct,
-                interval_seconds=db_config.interval_seconds,
-                slippage_bps=db_config.slippage_bps,
-                min_notional=db_config.min_notional,
-                max_position=db_config.max_position,
+            row = session.execute(_SELECT_SESSION_CONFIG, {"user_id": user_id}).first()
+        
+        if row is None:
+            return None
+        
+        # Keep an entry a concurrent save stored meanwhile; it is newer
+        with self._cache_lock:
+            return self._config_cache.setdefault(
+                user_id, SessionConfig.from_trusted(**row._mapping)
             )
     
     # SessionState operations
     
+    @staticmethod
+    def _state_row(state: SessionState) -> dict:
+        """Column values for upserting a session state."""
+        return {
+            "user_id": state.user_id,
+            "active": state.active,
+            "trades_executed": state.trades_executed,
+            "spent_notional": state.spent_notional,
+            "received_quote": state.received_quote,
+            "base_position_delta": state.base_position_delta,
+            "pattern_index": state.pattern_index,
+            "started_at": state.started_at,
+            "stopped_at": state.stopped_at,
+            "last_error": state.last_error,
+            "updated_at": utcnow(),
+        }
+    
     def save_session_state(self, state: SessionState) -> None:
         """Save or update a user's session state."""
         with self.get_session() as session:
-            db_state = session.query(SessionStateDB).filter_by(
-                user_id=state.user_id
-            ).first()
-            
-            if db_state:
-                # Update existing
-                db_state.active = state.active
-                db_state.trades_executed = state.trades_executed
-                db_state.spent_notional = state.spent_notional
-                db_state.received_quote = state.received_quote
-                db_state.base_position_delta = state.base_position_delta
-                db_state.pattern_index = state.pattern_index
-                db_state.started_at = state.started_at
-                db_state.stopped_at = state.stopped_at
-                db_state.last_error = state.last_error
-                db_state.updated_at = datetime.utcnow()
-            else:
-                # Create new
-                db_state = SessionStateDB(
-                    user_id=state.user_id,
-                    active=state.active,
-                    trades_executed=state.trades_executed,
-                    spent_notional=state.spent_notional,
-                    received_quote=state.received_quote,
-                    base_position_delta=state.base_position_delta,
-                    pattern_index=state.pattern_index,
-                    started_at=state.started_at,
-                    stopped_at=state.stopped_at,
-                    last_error=state.last_error,
-                )
-                session.add(db_state)
+            session.execute(_UPSERT_SESSION_STATE, self._state_row(state))
+        with self._cache_lock:
+            self._state_cache[state.user_id] = replace(state)
     
     def get_session_state(self, user_id: int) -> SessionState:
         """Retrieve a user's session state or create a new one."""
+        with self._cache_lock:
+            cached = self._state_cache.get(user_id)
+        if cached is not None:
+            return replace(cached)
+        
         with self.get_session() as session:
-            db_state = session.query(SessionStateDB).filter_by(
-                user_id=user_id
-            ).first()
-            
-            if not db_state:
-                # Return new state if none exists
-                return SessionState(user_id=user_id)
-            
-            return SessionState(
-                user_id=db_state.user_id,
-                active=db_state.active,
-                trades_executed=db_state.trades_executed,
-                spent_notional=db_state.spent_notional,
-                received_quote=db_state.received_quote,
-                base_position_delta=db_state.base_position_delta,
-                pattern_index=db_state.pattern_index,
-                started_at=db_state.started_at,
-                stopped_at=db_state.stopped_at,
-                last_error=db_state.last_error,
-            )
+            row = session.execute(_SELECT_SESSION_STATE, {"user_id": user_id}).first()
+        
+        if row is None:
+            # Return new state if none exists
+            return SessionState(user_id=user_id)
+        
+        # Keep an entry a concurrent save stored meanwhile; it is newer
+        with self._cache_lock:
+            session_state = self._state_cache.setdefault(user_id, SessionState(**row._mapping))
+        return replace(session_state)
+    
+    def get_session_bundle(self, user_id: int) -> Tuple[Optional[SessionConfig], SessionState]:
+        """
+        Retrieve a user's configuration and state together.
+        Served from the caches when both are present; otherwise read with one
+        joined query. The state is a new one if none is stored.
+        """
+        with self._cache_lock:
+            cached_config = self._config_cache.get(user_id)
+            cached_state = self._state_cache.get(user_id)
+        if cached_config is not None and cached_state is not None:
+            return cached_config, replace(cached_state)
+        
+        with self.get_session() as session:
+            row = session.execute(_SELECT_SESSION_BUNDLE, {"user_id": user_id}).first()
+        
+        if row is None:
+            # No configuration; the state may still exist on its own
+            return None, self.get_session_state(user_id)
+        
+        values = row._mapping
+        session_config = SessionConfig.from_trusted(**{
+            column.key: values[f"config_{column.key}"] for column in SESSION_CONFIG_COLUMNS
+        })
+        session_state = None
+        if values["state_user_id"] is not None:
+            session_state = SessionState(**{
+                column.key: values[f"state_{column.key}"] for column in SESSION_STATE_COLUMNS
+            })
+        
+        # Keep entries a concurrent save stored meanwhile; they are newer
+        with self._cache_lock:
+            session_config = self._config_cache.setdefault(user_id, session_config)
+            if session_state is not None:
+                session_state = self._state_cache.setdefault(user_id, session_state)
+        
+        if session_state is None:
+            return session_config, SessionState(user_id=user_id)
+        return session_config, replace(session_state)
     
     # TradeRecord operations
     
+    @staticmethod
+    def _trade_row(trade: TradeRecord) -> dict:
+        """Column values for inserting a trade record (ID is assigned by SQLite)."""
+        return {
+            "user_id": trade.user_id,
+            "side": trade.side,
+            "amount_in": trade.amount_in,
+            "amount_out": trade.amount_out,
+            "tx_hash": trade.tx_hash,
+            "timestamp": trade.timestamp,
+            "gas_used": trade.gas_used,
+            "gas_price_gwei": trade.gas_price_gwei,
+            "execution_price": trade.execution_price,
+        }
+    
     def save_trade_record(self, trade: TradeRecord) -> int:
         """Save a trade record and return its ID."""
         with self.get_session() as session:
-            db_trade = TradeRecordDB(
-                user_id=trade.user_id,
-                side=trade.side,
-                amount_in=trade.amount_in,
-                amount_out=trade.amount_out,
-                tx_hash=trade.tx_hash,
-                timestamp=trade.timestamp,
-                gas_used=trade.gas_used,
-                gas_price_gwei=trade.gas_price_gwei,
-                execution_price=trade.execution_price,
-            )
-            session.add(db_trade)
-            session.flush()  # Get the ID
-            trade_id = db_trade.id
-            logger.info(f"Saved trade record #{trade_id} for user {trade.user_id}")
-            return trade_id
+            result = session.execute(_INSERT_TRADE_RECORD, self._trade_row(trade))
+            trade_id = result.inserted_primary_key[0]
+        logger.info(f"Saved trade record #{trade_id} for user {trade.user_id}")
+        return trade_id
+    
+    def save_trade_and_state(self, trade: TradeRecord, state: SessionState) -> int:
+        """
+        Save a trade record and the session state it produced in one
+        transaction (one commit instead of two). Returns the trade's ID.
+        """
+        with self.get_session() as session:
+            result = session.execute(_INSERT_TRADE_RECORD, self._trade_row(trade))
+            trade_id = result.inserted_primary_key[0]
+            session.execute(_UPSERT_SESSION_STATE, self._state_row(state))
+        with self._cache_lock:
+            self._state_cache[state.user_id] = replace(state)
+        logger.info(f"Saved trade record #{trade_id} for user {trade.user_id}")
+        return trade_id
     
     def get_user_trades(self, user_id: int, limit: int = 100) -> List[TradeRecord]:
         """Retrieve recent trades for a user."""
         with self.get_session() as session:
-            db_trades = (
-                session.query(TradeRecordDB)
-                .filter_by(user_id=user_id)
-                .order_by(TradeRecordDB.timestamp.desc())
-                .limit(limit)
-                .all()
-            )
+            rows = session.execute(_SELECT_USER_TRADES, {"user_id": user_id, "limit": limit})
             
-            return [
-                TradeRecord(
-                    id=db_trade.id,
-                    user_id=db_trade.user_id,
-                    side=db_trade.side,
-                    amount_in=db_trade.amount_in,
-                    amount_out=db_trade.amount_out,
-                    tx_hash=db_trade.tx_hash,
-                    timestamp=db_trade.timestamp,
-                    gas_used=db_trade.gas_used,
-                    gas_price_gwei=db_trade.gas_price_gwei,
-                    execution_price=db_trade.execution_price,
-                )
-                for db_trade in db_trades
-            ]
+            # Columns are selected in TradeRecord field order, so rows map positionally
+            return [TradeRecord(*row) for row in rows]
     
     def get_trade_count(self, user_id: int) -> int:
         """Get total number of trades for a user."""
         with self.get_session() as session:
-            return session.query(TradeRecordDB).filter_by(user_id=user_id).count()
+            return session.execute(_COUNT_USER_TRADES, {"user_id": user_id}).scalar_one()
     
-    def backup_database(self, backup_path: str = None) -> str:
+    def backup_database(self, backup_path: str = None, pages: int = -1) -> str:
         """
         Create a backup of the database.
         
+        Uses SQLite's online backup API, which produces a consistent snapshot
+        (including pages still in the WAL) while the bot keeps writing.
+        
         Args:
             backup_path: Optional path for backup file. If None, uses timestamp.
+            pages: Pages copied per backup step (-1 copies everything in one step).
         
         Returns:
             Path to the backup file.
         """
-        import shutil
-        import os
-        from datetime import datetime
-        
         if backup_path is None:
             base_name = self.engine.url.database or "bot_data.db"
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -301,11 +469,17 @@ class Database:
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir, exist_ok=True)
         
-        # Copy database file
         db_path = self.engine.url.database
         if not os.path.exists(db_path):
             raise FileNotFoundError(f"Database file not found: {db_path}")
         
-        shutil.copy2(db_path, backup_path)
+        source = self.engine.raw_connection()
+        destination = sqlite3.connect(backup_path)
+        try:
+            source.driver_connection.backup(destination, pages=pages)
+        finally:
+            destination.close()
+            source.close()
+        
         logger.info(f"Database backup created: {backup_path}")
-        return backup_path
\ No newline at end of file
+        return backup_path
@@ -6,19 +6,228 @@ Handles token swaps, balance queries, and price estimation.
 import logging
 import json
 import os
+import random
+import threading
 import time
-from typing import Dict, Tuple, Optional, Any
-from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Dict, List, Tuple, Optional, Any
 
+from hexbytes import HexBytes
 from web3 import Web3
+from web3._utils.abi import get_abi_output_types
+from web3._utils.method_formatters import receipt_formatter
 from web3.contract import Contract
 from web3.exceptions import ContractLogicError, TimeExhausted
 from eth_account import Account
 
 from .config import config
+from .rpc import (
+    RPC_TRANSPORT_ERRORS,
+    BatchHTTPProvider,
+    BatchNotSupportedError,
+    get_provider,
+    is_retryable_error,
+    rank_endpoints,
+)
 
 logger = logging.getLogger(__name__)
 
+# Minimal ABIs: only the functions and events this client uses
+ERC20_ABI = [
+    {
+        "name": "decimals", "type": "function", "stateMutability": "view",
+        "inputs": [],
+        "outputs": [{"name": "", "type": "uint8"}],
+    },
+    {
+        "name": "symbol", "type": "function", "stateMutability": "view",
+        "inputs": [],
+        "outputs": [{"name": "", "type": "string"}],
+    },
+    {
+        "name": "balanceOf", "type": "function", "stateMutability": "view",
+        "inputs": [{"name": "_owner", "type": "address"}],
+        "outputs": [{"name": "balance", "type": "uint256"}],
+    },
+    {
+        "name": "allowance", "type": "function", "stateMutability": "view",
+        "inputs": [
+            {"name": "_owner", "type": "address"},
+            {"name": "_spender", "type": "address"},
+        ],
+        "outputs": [{"name": "", "type": "uint256"}],
+    },
+    {
+        "name": "approve", "type": "function", "stateMutability": "nonpayable",
+        "inputs": [
+            {"name": "_spender", "type": "address"},
+            {"name": "_value", "type": "uint256"},
+        ],
+        "outputs": [{"name": "", "type": "bool"}],
+    },
+    {
+        "name": "Transfer", "type": "event", "anonymous": False,
+        "inputs": [
+            {"indexed": True, "name": "from", "type": "address"},
+            {"indexed": True, "name": "to", "type": "address"},
+            {"indexed": False, "name": "value", "type": "uint256"},
+        ],
+    },
+]
+
+ROUTER_ABI = [
+    {
+        "name": "getAmountsOut", "type": "function", "stateMutability": "view",
+        "inputs": [
+            {"name": "amountIn", "type": "uint256"},
+            {"name": "path", "type": "address[]"},
+        ],
+        "outputs": [{"name": "amounts", "type": "uint256[]"}],
+    },
+    {
+        "name": "getAmountsIn", "type": "function", "stateMutability": "view",
+        "inputs": [
+            {"name": "amountOut", "type": "uint256"},
+            {"name": "path", "type": "address[]"},
+        ],
+        "outputs": [{"name": "amounts", "type": "uint256[]"}],
+    },
+    {
+        "name": "swapExactTokensForTokens", "type": "function", "stateMutability": "nonpayable",
+        "inputs": [
+            {"name": "amountIn", "type": "uint256"},
+            {"name": "amountOutMin", "type": "uint256"},
+            {"name": "path", "type": "address[]"},
+            {"name": "to", "type": "address"},
+            {"name": "deadline", "type": "uint256"},
+        ],
+        "outputs": [{"name": "amounts", "type": "uint256[]"}],
+    },
+]
+
+# keccak("Transfer(address,address,uint256)"), the ERC20 Transfer event topic
+TRANSFER_TOPIC0 = HexBytes("0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef")
+
+# Decimals and symbols of common tokens by chain ID and checksum address, so
+# popular pairs need no metadata lookup even on a cold start
+WELL_KNOWN_TOKENS: Dict[int, Dict[str, Dict[str, Any]]] = {
+    1: {  # Ethereum
+        "0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2": {"decimals": 18, "symbol": "WETH"},
+        "0xA0b86991c6218b36c1d19D4a2e9Eb0cE3606eB48": {"decimals": 6, "symbol": "USDC"},
+        "0xdAC17F958D2ee523a2206206994597C13D831ec7": {"decimals": 6, "symbol": "USDT"},
+        "0x6B175474E89094C44Da98b954EedeAC495271d0F": {"decimals": 18, "symbol": "DAI"},
+        "0x2260FAC5E5542a773Aa44fBCfeDf7C193bc2C599": {"decimals": 8, "symbol": "WBTC"},
+    },
+    8453: {  # Base
+        "0x4200000000000000000000000000000000000006": {"decimals": 18, "symbol": "WETH"},
+        "0x833589fCD6eDb6E08f4c7C32D4f71b54bdA02913": {"decimals": 6, "symbol": "USDC"},
+    },
+    42161: {  # Arbitrum One
+        "0x82aF49447D8a07e3bd95BD0d56f35241523fBab1": {"decimals": 18, "symbol": "WETH"},
+        "0xaf88d065e77c8cC2239327C5EDb3A432268e5831": {"decimals": 6, "symbol": "USDC"},
+    },
+}
+
+# Multicall3 is deployed at the same address on most EVM chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+MULTICALL3_ABI = [
+    {
+        "name": "aggregate3", "type": "function", "stateMutability": "payable",
+        "inputs": [
+            {
+                "name": "calls", "type": "tuple[]",
+                "components": [
+                    {"name": "target", "type": "address"},
+                    {"name": "allowFailure", "type": "bool"},
+                    {"name": "callData", "type": "bytes"},
+                ],
+            },
+        ],
+        "outputs": [
+            {
+                "name": "returnData", "type": "tuple[]",
+                "components": [
+                    {"name": "success", "type": "bool"},
+                    {"name": "returnData", "type": "bytes"},
+                ],
+            },
+        ],
+    },
+]
+
+# How long to wait for a transaction receipt before giving up (seconds)
+RECEIPT_TIMEOUT = 300
+
+# Receipt polling interval. web3's 0.1s default issues ~10 requests a second
+# per pending transaction; blocks arrive every 2-12s on supported chains.
+RECEIPT_POLL_LATENCY = 0.5  # seconds
+
+# Error code eth_sendRawTransactionSync returns when the tx is not mined in time
+SEND_SYNC_TIMEOUT_CODE = 4
+
+# Send errors meaning the node already has the transaction, e.g. from an
+# earlier attempt whose response was lost ("nonce too low" once it is mined)
+ALREADY_SENT_MESSAGES = (
+    "already known",
+    "known transaction",
+    "already imported",
+    "nonce too low",
+)
+
+# EIP-1559 tip: median of the 50th-percentile reward over recent blocks,
+# refreshed at most about once per block
+FEE_HISTORY_BLOCKS = 5
+FEE_HISTORY_PERCENTILE = 50
+PRIORITY_FEE_TTL = 12  # seconds
+
+# Legacy eth_gasPrice quotes are reused for about one block as well
+GAS_PRICE_TTL = 12  # seconds
+
+# Swaps revert if not mined within this many seconds of signing
+SWAP_DEADLINE_SECONDS = 300
+
+# Upper bound on RPC reads issued concurrently when batching is unavailable
+RPC_PARALLELISM = 4
+
+# Allowances at or above this are treated as unlimited (a max-uint256 approval
+# never runs out in practice), so their cache entries don't expire
+UNLIMITED_ALLOWANCE = 2**128
+
+# Retry backoff: 1s, 2s, 4s, ... plus up to 50% jitter, capped
+RPC_BACKOFF_MAX = 30  # seconds
+
+# A router quote passed into a swap is reused only if it is this fresh (seconds)
+QUOTE_MAX_AGE = 1.0
+
+
+# EIP-55 checksumming costs a keccak per call; the bot only sees a few addresses
+_to_checksum_address = lru_cache(maxsize=256)(Web3.to_checksum_address)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter so retrying clients don't stay in lockstep."""
+    return min(2 ** attempt * (1 + random.random() * 0.5), RPC_BACKOFF_MAX)
+
+
+def _is_method_unsupported(error: Dict[str, Any]) -> bool:
+    """Return True if a JSON-RPC error means the node doesn't implement the method."""
+    if error.get("code") == -32601:
+        return True
+    message = str(error.get("message", "")).lower()
+    return any(
+        marker in message
+        for marker in ("not found", "does not exist", "not available", "not supported", "unsupported")
+    )
+
+
+def _is_already_sent(error: Any) -> bool:
+    """Return True if a send error means the node already has the transaction."""
+    if isinstance(error, dict):
+        error = error.get("message", "")
+    message = str(error).lower()
+    return any(marker in message for marker in ALREADY_SENT_MESSAGES)
+
 
 class DexClient:
     """
@@ -28,95 +237,639 @@ class DexClient:
     
     def __init__(self):
         """Initialize web3 connection and load contracts."""
-        # Connect to EVM node with timeout
-        self.w3 = Web3(
-            Web3.HTTPProvider(
-                config.RPC_URL,
-                request_kwargs={'timeout': config.RPC_TIMEOUT}
-            )
+        # Worker threads used to overlap reads if the node refuses batches
+        self._rpc_pool = ThreadPoolExecutor(
+            max_workers=RPC_PARALLELISM, thread_name_prefix="dex-rpc"
+        )
+        # Separate workers for BUY allowance checks: these wait on reads in
+        # _rpc_pool (and possibly on an approval receipt), so running them in
+        # that pool could leave it with no free worker for their reads
+        self._allowance_pool = ThreadPoolExecutor(
+            max_workers=RPC_PARALLELISM, thread_name_prefix="dex-allowance"
         )
+        self._batch_supported = True
+        
+        # Connect to EVM node with timeout. With alternates configured, use the
+        # lowest-latency endpoint and keep the rest ranked for failover.
+        provider_kwargs = {
+            'timeout': config.RPC_TIMEOUT,
+            'pool_size': config.RPC_POOL_SIZE,
+            'http2': config.RPC_HTTP2,
+        }
+        rpc_urls = list(dict.fromkeys((config.RPC_URL,) + config.RPC_URLS))
+        if len(rpc_urls) > 1:
+            providers = rank_endpoints(rpc_urls, **provider_kwargs)
+            if not providers:
+                raise ConnectionError(f"Failed to connect to any RPC endpoint: {rpc_urls}")
+            logger.info(f"Using fastest RPC endpoint: {providers[0].endpoint_uri}")
+        else:
+            providers = [get_provider(config.RPC_URL, **provider_kwargs)]
+        self._standby_providers = providers[1:]
+        
+        self.w3 = Web3(providers[0])
         if not self._connect_with_retry():
             raise ConnectionError(f"Failed to connect to RPC endpoint: {config.RPC_URL}")
         
-        logger.info(f"Connected to network, chain ID: {self.w3.eth.chain_id}")
+        # Optional private relay (e.g. Flashbots Protect, MEV Blocker) for swaps
+        self._relay: Optional[BatchHTTPProvider] = None
+        if config.PRIVATE_RELAY_URL:
+            self._relay = get_provider(
+                config.PRIVATE_RELAY_URL,
+                timeout=config.RPC_TIMEOUT,
+                pool_size=2,
+            )
+            logger.info("Swaps will be submitted through the private relay")
+        
+        self.chain_id = self.w3.eth.chain_id
+        logger.info(f"Connected to network, chain ID: {self.chain_id}")
+        
+        # Nonces are handed out locally; None means "re-read from the node"
+        self._nonce: Optional[int] = None
+        self._nonce_lock = threading.Lock()
+        
+        # Cached fee data. Fetch times start at -inf so the first check always
+        # sees them as stale (time.monotonic() can be below the TTL shortly
+        # after boot).
+        self._priority_fee: Optional[int] = None
+        self._priority_fee_at = float("-inf")
+        self._gas_price: Optional[int] = None
+        self._gas_price_at = float("-inf")
+        
+        # Fee type and single-round-trip submission depend on the endpoint
+        self._probe_capabilities()
         
         # Load wallet
         self.account = Account.from_key(config.WALLET_PRIVATE_KEY)
         self.wallet_address = self.account.address
         logger.info(f"Loaded wallet: {self.wallet_address}")
         
-        # Load ABIs
-        router_abi = self._load_abi("uniswap_v2_router.json")
-        erc20_abi = self._load_abi("erc20.json")
+        # Checksummed addresses and swap paths, computed once
+        self._router_address = _to_checksum_address(config.DEX_ROUTER_ADDRESS)
+        self._base_address = _to_checksum_address(config.BASE_TOKEN_ADDRESS)
+        self._quote_address = _to_checksum_address(config.QUOTE_TOKEN_ADDRESS)
+        self._buy_path = [self._quote_address, self._base_address]
+        self._sell_path = [self._base_address, self._quote_address]
         
         # Initialize contracts
         self.router = self.w3.eth.contract(
-            address=Web3.to_checksum_address(config.DEX_ROUTER_ADDRESS),
-            abi=router_abi
+            address=self._router_address,
+            abi=ROUTER_ABI
         )
         
-        self.base_token = self.w3.eth.contract(
-            address=Web3.to_checksum_address(config.BASE_TOKEN_ADDRESS),
-            abi=erc20_abi
-        )
+        # ERC20 contract objects keyed by checksum address (see _token_contract)
+        self._token_contracts: Dict[str, Contract] = {}
+        self.base_token = self._token_contract(self._base_address)
+        self.quote_token = self._token_contract(self._quote_address)
         
-        self.quote_token = self.w3.eth.contract(
-            address=Web3.to_checksum_address(config.QUOTE_TOKEN_ADDRESS),
-            abi=erc20_abi
-        )
+        # Multicall3, when deployed on this chain, folds view calls into one eth_call
+        self.multicall = self._load_multicall()
+        
+        # Known router allowances, persisted across restarts
+        self._allowance_cache_path = os.path.join(config.CACHE_DIR, "allowances.json")
+        self._allowance_lock = threading.Lock()
+        self._allowance_cache = self._load_json_cache(self._allowance_cache_path)
         
-        # Get token decimals
-        self.base_decimals = self.base_token.functions.decimals().call()
-        self.quote_decimals = self.quote_token.functions.decimals().call()
+        # Token decimals and symbols (disk-cached; immutable on-chain)
+        self._load_token_metadata()
+        
+        # Raw units per whole token
+        self._base_unit = 10 ** self.base_decimals
+        self._quote_unit = 10 ** self.quote_decimals
+        
+        # get_price and get_balances always read the same things (1 base unit
+        # quoted along the sell path, the wallet's two balances), so ABI-encode
+        # those eth_calls once and decode the results with fixed output types
+        self._price_request = self._eth_call_request(
+            self.router.functions.getAmountsOut(self._base_unit, self._sell_path)
+        )
+        balance_functions = (
+            self.base_token.functions.balanceOf(self.wallet_address),
+            self.quote_token.functions.balanceOf(self.wallet_address),
+        )
+        if self.multicall is not None:
+            self._balance_requests = [self._eth_call_request(
+                self.multicall.functions.aggregate3([
+                    (function.address, False, function._encode_transaction_data())
+                    for function in balance_functions
+                ])
+            )]
+        else:
+            self._balance_requests = [
+                self._eth_call_request(function) for function in balance_functions
+            ]
         
         logger.info(f"Base token decimals: {self.base_decimals}")
         logger.info(f"Quote token decimals: {self.quote_decimals}")
         
-        # Cache token symbols for logging
-        try:
-            self.base_symbol = self.base_token.functions.symbol().call()
-            self.quote_symbol = self.quote_token.functions.symbol().call()
-        except Exception as e:
-            logger.warning(f"Could not fetch token symbols: {e}")
-            self.base_symbol = "BASE"
-            self.quote_symbol = "QUOTE"
     
     def _connect_with_retry(self) -> bool:
         """Connect to RPC with retry logic."""
         for attempt in range(config.RPC_MAX_RETRIES):
+            # is_connected() usually reports failure by returning False, not raising
             try:
                 if self.w3.is_connected():
                     return True
+                logger.warning(f"RPC connection attempt {attempt + 1} failed: node unreachable")
             except Exception as e:
                 logger.warning(f"RPC connection attempt {attempt + 1} failed: {e}")
-                if attempt < config.RPC_MAX_RETRIES - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
+            if attempt < config.RPC_MAX_RETRIES - 1:
+                time.sleep(_backoff_delay(attempt))
         return False
     
     def _rpc_call_with_retry(self, func, *args, **kwargs):
-        """Execute RPC call with retry logic."""
+        """
+        Execute RPC call with retry logic.
+        Only transient failures are retried; reverts and bad requests raise at once.
+        """
         last_exception = None
         for attempt in range(config.RPC_MAX_RETRIES):
             try:
                 return func(*args, **kwargs)
-            except (ConnectionError, TimeExhausted, Exception) as e:
+            except Exception as e:
+                if not is_retryable_error(e):
+                    raise
                 last_exception = e
                 logger.warning(f"RPC call attempt {attempt + 1}/{config.RPC_MAX_RETRIES} failed: {e}")
                 if attempt < config.RPC_MAX_RETRIES - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
+                    if isinstance(e, RPC_TRANSPORT_ERRORS):
+                        self._failover()
+                    time.sleep(_backoff_delay(attempt))
         raise last_exception
     
-    def _load_abi(self, filename: str) -> list:
-        """Load contract ABI from file."""
-        abi_path = os.path.join(os.path.dirname(__file__), "abi", filename)
+    def _failover(self) -> None:
+        """Switch to the next-best RPC endpoint; the failing one goes to the back."""
+        if not self._standby_providers:
+            return
+        failed = self.w3.provider
+        self.w3.provider = self._standby_providers.pop(0)
+        self._standby_providers.append(failed)
+        self._batch_supported = True
+        logger.warning(
+            f"RPC endpoint {failed.endpoint_uri} failing, "
+            f"switched to {self.w3.provider.endpoint_uri}"
+        )
+        self._probe_capabilities()
+    
+    def _probe_capabilities(self) -> None:
+        """Detect what the current endpoint supports (run again after a failover)."""
+        # Type-2 (EIP-1559) fees unless a fixed GAS_PRICE_GWEI is configured
+        self._eip1559 = not config.GAS_PRICE_GWEI and self._probe_eip1559()
+        # Prefer single-round-trip submission when the node supports it
+        self._send_sync_supported = self._probe_send_sync()
+    
+    def _run_parallel(self, *calls):
+        """Run independent blocking RPC callables concurrently; results keep call order."""
+        futures = [self._rpc_pool.submit(call) for call in calls]
+        return [future.result() for future in futures]
+    
+    def _probe_eip1559(self) -> bool:
+        """Check that the chain has a base fee and the node serves eth_feeHistory."""
         try:
-            with open(abi_path, "r") as f:
+            block, fee_history = self._batch_rpc([
+                ("eth_getBlockByNumber", ["latest", False]),
+                self._fee_history_request(),
+            ])
+        except Exception as e:
+            logger.info(f"EIP-1559 fees unavailable, using legacy gas price: {e}")
+            return False
+        
+        if block.get("baseFeePerGas") is None:
+            logger.info("Chain has no base fee, using legacy gas price")
+            return False
+        self._update_priority_fee(fee_history)
+        return True
+    
+    @staticmethod
+    def _fee_history_request() -> Tuple[str, list]:
+        return "eth_feeHistory", [hex(FEE_HISTORY_BLOCKS), "latest", [FEE_HISTORY_PERCENTILE]]
+    
+    def _update_priority_fee(self, fee_history: Dict[str, Any]) -> None:
+        """Cache the median recent tip from a raw eth_feeHistory result."""
+        rewards = sorted(int(reward[0], 16) for reward in fee_history.get("reward") or [] if reward)
+        if rewards:
+            self._priority_fee = rewards[len(rewards) // 2]
+        else:
+            self._priority_fee = self.w3.eth.max_priority_fee
+        self._priority_fee_at = time.monotonic()
+    
+    def _fee_requests(self) -> List[Tuple[str, Any]]:
+        """
+        Batch entries needed to price a transaction: the latest block (for its
+        base fee) and fee history under EIP-1559, else eth_gasPrice. Entries
+        still covered by a cached quote are left out, so this may be empty.
+        """
+        calls = []
+        if self._eip1559:
+            calls.append(("eth_getBlockByNumber", ["latest", False]))
+            if time.monotonic() - self._priority_fee_at > PRIORITY_FEE_TTL:
+                calls.append(self._fee_history_request())
+        elif not config.GAS_PRICE_GWEI:
+            if time.monotonic() - self._gas_price_at > GAS_PRICE_TTL:
+                calls.append(("eth_gasPrice", []))
+        return calls
+    
+    def _fee_fields(self, fee_results: List[Any]) -> Dict[str, int]:
+        """
+        Turn _fee_requests() results into transaction fee fields:
+        type-2 maxFeePerGas (2x base fee + tip) / maxPriorityFeePerGas,
+        or a legacy gasPrice.
+        """
+        if self._eip1559:
+            if len(fee_results) > 1:
+                self._update_priority_fee(fee_results[1])
+            base_fee = int(fee_results[0]["baseFeePerGas"], 16)
+            return {
+                'type': 2,
+                'maxFeePerGas': 2 * base_fee + self._priority_fee,
+                'maxPriorityFeePerGas': self._priority_fee,
+            }
+        if config.GAS_PRICE_GWEI:
+            return {'gasPrice': self.w3.to_wei(config.GAS_PRICE_GWEI, 'gwei')}
+        if fee_results:
+            self._gas_price = int(fee_results[0], 16)
+            self._gas_price_at = time.monotonic()
+        return {'gasPrice': self._gas_price}
+    
+    def _probe_send_sync(self) -> bool:
+        """
+        Check whether the node implements eth_sendRawTransactionSync.
+        Sends an empty payload: supporting nodes reject it as invalid params,
+        others answer method-not-found.
+        """
+        try:
+            response = self.w3.provider.make_request("eth_sendRawTransactionSync", ["0x"])
+        except Exception as e:
+            logger.debug(f"eth_sendRawTransactionSync probe failed: {e}")
+            return False
+        
+        supported = not _is_method_unsupported(response.get("error") or {})
+        logger.info(f"eth_sendRawTransactionSync supported: {supported}")
+        return supported
+    
+    def _next_nonce(self) -> int:
+        """Hand out the next account nonce, reading it from the node only when unknown."""
+        with self._nonce_lock:
+            if self._nonce is None:
+                self._nonce = self.w3.eth.get_transaction_count(self.wallet_address, "pending")
+            nonce = self._nonce
+            self._nonce += 1
+            return nonce
+    
+    def _reset_nonce(self) -> None:
+        """Forget the local nonce so the next transaction resyncs with the node."""
+        with self._nonce_lock:
+            self._nonce = None
+    
+    def _send_transaction(
+        self,
+        tx: Dict[str, Any],
+        label: str,
+        private: bool = False
+    ) -> Tuple[HexBytes, Dict[str, Any]]:
+        """
+        Assign a nonce, sign and broadcast a transaction; return (tx_hash, receipt).
+        With private=True the transaction goes through PRIVATE_RELAY_URL if configured.
+        
+        Any failure before a receipt arrives resets the local nonce, since the
+        transaction may or may not have reached the mempool.
+        """
+        tx['nonce'] = self._next_nonce()
+        try:
+            signed_tx = self.account.sign_transaction(tx)
+            logger.info(f"Sending {label} transaction: {signed_tx.hash.hex()}")
+            if private and self._relay is not None:
+                return self._broadcast_private(signed_tx)
+            return self._broadcast(signed_tx)
+        except Exception:
+            self._reset_nonce()
+            raise
+    
+    def _broadcast_private(self, signed_tx) -> Tuple[HexBytes, Dict[str, Any]]:
+        """
+        Submit a signed transaction to the private relay, then poll the main RPC
+        for its receipt. The transaction skips the public mempool.
+        """
+        try:
+            response = self._relay.make_request(
+                "eth_sendRawTransaction", [signed_tx.rawTransaction.hex()]
+            )
+        except RPC_TRANSPORT_ERRORS as e:
+            return signed_tx.hash, self._recover_receipt(signed_tx, e)
+        
+        error = response.get("error")
+        if error is not None:
+            if not _is_already_sent(error):
+                raise ValueError(f"Private relay rejected transaction: {error}")
+            return signed_tx.hash, self._recover_receipt(signed_tx, error)
+        
+        return signed_tx.hash, self._wait_for_receipt(signed_tx.hash)
+    
+    def _broadcast(self, signed_tx) -> Tuple[HexBytes, Dict[str, Any]]:
+        """
+        Broadcast a signed transaction and return (tx_hash, receipt).
+        
+        Uses eth_sendRawTransactionSync (receipt in the same response) when
+        available, otherwise send_raw_transaction + receipt polling.
+        """
+        if self._send_sync_supported:
+            try:
+                response = self.w3.provider.make_request(
+                    "eth_sendRawTransactionSync", [signed_tx.rawTransaction.hex()]
+                )
+            except RPC_TRANSPORT_ERRORS as e:
+                return signed_tx.hash, self._recover_receipt(signed_tx, e)
+            
+            error = response.get("error")
+            if error is None:
+                return signed_tx.hash, receipt_formatter(response["result"])
+            if _is_already_sent(error):
+                return signed_tx.hash, self._recover_receipt(signed_tx, error)
+            if error.get("code") == SEND_SYNC_TIMEOUT_CODE:
+                logger.info(f"Transaction {signed_tx.hash.hex()} not mined yet, polling for receipt")
+                return signed_tx.hash, self._wait_for_receipt(signed_tx.hash)
+            if not _is_method_unsupported(error):
+                raise ValueError(f"Transaction submission failed: {error}")
+            
+            # This endpoint (e.g. a standby after failover) lacks the method
+            logger.info("eth_sendRawTransactionSync unsupported, using eth_sendRawTransaction")
+            self._send_sync_supported = False
+        
+        try:
+            tx_hash = self.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
+        except RPC_TRANSPORT_ERRORS as e:
+            return signed_tx.hash, self._recover_receipt(signed_tx, e)
+        except ValueError as e:
+            # web3 raises the node's JSON-RPC error as ValueError(error)
+            error = e.args[0] if e.args else e
+            if not _is_already_sent(error):
+                raise
+            return signed_tx.hash, self._recover_receipt(signed_tx, error)
+        return tx_hash, self._wait_for_receipt(tx_hash)
+    
+    def _recover_receipt(self, signed_tx, reason: Any) -> Dict[str, Any]:
+        """
+        Poll for the receipt of a transaction whose submission failed in a way
+        that may still have broadcast it (lost response, gateway error, or the
+        node already knowing it). Raises only if no receipt appears.
+        """
+        logger.warning(
+            f"Submitting {signed_tx.hash.hex()} failed ({reason}); "
+            f"it may have been sent, polling for receipt"
+        )
+        try:
+            return self._wait_for_receipt(signed_tx.hash)
+        except TimeExhausted as e:
+            raise ValueError(f"Transaction submission failed: {reason}") from e
+    
+    def _wait_for_receipt(self, tx_hash: HexBytes) -> Dict[str, Any]:
+        """Poll the main RPC for a transaction receipt at RECEIPT_POLL_LATENCY."""
+        return self.w3.eth.wait_for_transaction_receipt(
+            tx_hash, timeout=RECEIPT_TIMEOUT, poll_latency=RECEIPT_POLL_LATENCY
+        )
+    
+    def _batch_rpc(self, calls: List[Tuple[str, Any]]) -> List[Any]:
+        """
+        Send independent JSON-RPC calls in a single HTTP request.
+        Falls back to concurrent single requests if the node refuses batches.
+        Returns raw (unformatted) results in call order.
+        """
+        if not calls:
+            return []
+        if self._batch_supported:
+            try:
+                return self.w3.provider.make_batch_request(calls)
+            except BatchNotSupportedError as e:
+                logger.warning(f"RPC batching unavailable, using single requests: {e}")
+                self._batch_supported = False
+        
+        responses = self._run_parallel(*(
+            lambda method=method, params=params: self.w3.provider.make_request(method, params)
+            for method, params in calls
+        ))
+        results = []
+        for (method, _), response in zip(calls, responses):
+            if "error" in response:
+                raise ValueError(f"{method} call failed: {response['error']}")
+            results.append(response["result"])
+        return results
+    
+    @staticmethod
+    def _eth_call_request(contract_function, block: str = "latest") -> Tuple[str, list]:
+        """Build a raw eth_call request for a bound contract function."""
+        return "eth_call", [
+            {
+                "to": contract_function.address,
+                "data": contract_function._encode_transaction_data(),
+            },
+            block,
+        ]
+    
+    def _decode_call_result(self, contract_function, result: str) -> Any:
+        """Decode a raw eth_call result using the function's ABI outputs."""
+        decoded = self.w3.codec.decode(
+            get_abi_output_types(contract_function.abi), HexBytes(result)
+        )
+        return decoded[0] if len(decoded) == 1 else decoded
+    
+    def _batch_contract_calls(self, *contract_functions, block: str = "latest") -> List[Any]:
+        """
+        Execute several contract view calls in one batched round-trip (with retry).
+        Each call is evaluated at block (a tag or hex number) independently.
+        """
+        results = self._rpc_call_with_retry(
+            self._batch_rpc,
+            [self._eth_call_request(function, block) for function in contract_functions],
+        )
+        return [
+            self._decode_call_result(function, result)
+            for function, result in zip(contract_functions, results)
+        ]
+    
+    def _read_swap_inputs(
+        self,
+        quote_function,
+        quote: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[int], Dict[str, int]]:
+        """
+        Fetch everything a swap needs before signing in one batched request.
+        Returns (amounts, fee fields).
+        
+        A quote from quote_sell() younger than QUOTE_MAX_AGE replaces the
+        router call; otherwise quote_function is evaluated in the batch.
+        """
+        if quote is not None and time.monotonic() - quote['quoted_at'] < QUOTE_MAX_AGE:
+            results = self._rpc_call_with_retry(self._batch_rpc, self._fee_requests())
+            return list(quote['amounts']), self._fee_fields(results)
+        
+        calls = [self._eth_call_request(quote_function)] + self._fee_requests()
+        
+        results = self._rpc_call_with_retry(self._batch_rpc, calls)
+        
+        amounts = self._decode_call_result(quote_function, results[0])
+        return list(amounts), self._fee_fields(results[1:])
+    
+    def _load_multicall(self) -> Optional[Contract]:
+        """Return the Multicall3 contract if it is deployed on this chain."""
+        try:
+            code = self.w3.eth.get_code(MULTICALL3_ADDRESS)
+        except Exception as e:
+            logger.info(f"Multicall3 lookup failed, using batched eth_calls: {e}")
+            return None
+        if not code:
+            logger.info("Multicall3 not deployed on this chain, using batched eth_calls")
+            return None
+        return self.w3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+    
+    def _aggregate_calls(self, *contract_functions) -> List[Any]:
+        """
+        Execute several contract view calls as one Multicall3 aggregate3 eth_call.
+        Falls back to a batched request when Multicall3 isn't available.
+        """
+        if self.multicall is None:
+            return self._batch_contract_calls(*contract_functions)
+        
+        aggregate = self.multicall.functions.aggregate3([
+            (function.address, False, function._encode_transaction_data())
+            for function in contract_functions
+        ])
+        # Sent raw, bypassing web3's per-call chain ID validation request
+        (results,) = self._batch_contract_calls(aggregate)
+        return [
+            self._decode_call_result(function, return_data)
+            for function, (_, return_data) in zip(contract_functions, results)
+        ]
+    
+    def _token_contract(self, token_address: str) -> Contract:
+        """Return the ERC20 contract for an address, building it only once."""
+        token_address = _to_checksum_address(token_address)
+        token = self._token_contracts.get(token_address)
+        if token is None:
+            token = self.w3.eth.contract(address=token_address, abi=ERC20_ABI)
+            self._token_contracts[token_address] = token
+        return token
+    
+    @staticmethod
+    def _load_json_cache(path: str) -> Dict[str, Dict[str, Any]]:
+        """Load a persisted JSON cache under CACHE_DIR (empty if missing or unreadable)."""
+        try:
+            with open(path, "r") as f:
                 return json.load(f)
         except FileNotFoundError:
-            raise FileNotFoundError(
-                f"ABI file not found: {abi_path}. "
-                f"Please ensure ABI files are in the bot/abi/ directory."
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache {path}: {e}")
+            return {}
+    
+    @staticmethod
+    def _save_json_cache(path: str, data: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Write a JSON cache atomically. The rename means concurrent processes
+        never see a partial file; the last writer wins.
+        """
+        try:
+            os.makedirs(config.CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not persist cache {path}: {e}")
+    
+    def _load_token_metadata(self) -> None:
+        """
+        Set decimals and symbols for both tokens.
+        
+        They are immutable, so they are cached on disk per chain and address;
+        warm starts make no RPC calls for them. WELL_KNOWN_TOKENS covers
+        common tokens without any lookup.
+        """
+        token_cache_path = os.path.join(config.CACHE_DIR, "tokens.json")
+        token_cache = self._load_json_cache(token_cache_path)
+        base_key = f"{self.chain_id}:{self._base_address}"
+        quote_key = f"{self.chain_id}:{self._quote_address}"
+        
+        well_known = WELL_KNOWN_TOKENS.get(self.chain_id, {})
+        base_meta = well_known.get(self._base_address) or token_cache.get(base_key)
+        quote_meta = well_known.get(self._quote_address) or token_cache.get(quote_key)
+        if base_meta and quote_meta:
+            self.base_decimals = base_meta["decimals"]
+            self.base_symbol = base_meta["symbol"]
+            self.quote_decimals = quote_meta["decimals"]
+            self.quote_symbol = quote_meta["symbol"]
+            return
+        
+        # Token decimals and symbols (for logging) in one round-trip
+        try:
+            (
+                self.base_decimals, self.quote_decimals,
+                self.base_symbol, self.quote_symbol,
+            ) = self._aggregate_calls(
+                self.base_token.functions.decimals(),
+                self.quote_token.functions.decimals(),
+                self.base_token.functions.symbol(),
+                self.quote_token.functions.symbol(),
+            )
+        except Exception as e:
+            logger.warning(f"Could not fetch token symbols: {e}")
+            self.base_decimals, self.quote_decimals = self._aggregate_calls(
+                self.base_token.functions.decimals(),
+                self.quote_token.functions.decimals(),
             )
+            self.base_symbol = "BASE"
+            self.quote_symbol = "QUOTE"
+            return  # don't persist placeholder symbols
+        
+        token_cache[base_key] = {"decimals": self.base_decimals, "symbol": self.base_symbol}
+        token_cache[quote_key] = {"decimals": self.quote_decimals, "symbol": self.quote_symbol}
+        self._save_json_cache(token_cache_path, token_cache)
+    
+    def _remember_allowance(self, cache_key: str, allowance: int) -> None:
+        """Record an allowance read on-chain and flush the cache to disk."""
+        with self._allowance_lock:
+            self._allowance_cache[cache_key] = {
+                "allowance": allowance,
+                "checked_at": time.time(),
+            }
+            self._save_json_cache(self._allowance_cache_path, self._allowance_cache)
+    
+    def _forget_allowance(self, token_address: str) -> None:
+        """Drop a cached allowance so the next swap re-reads it on-chain."""
+        cache_key = f"{self.chain_id}:{self.wallet_address}:{token_address}:{self._router_address}"
+        with self._allowance_lock:
+            if self._allowance_cache.pop(cache_key, None) is not None:
+                self._save_json_cache(self._allowance_cache_path, self._allowance_cache)
+    
+    def _decode_balances(self, results: List[Any]) -> Dict[str, float]:
+        """Decode the raw results of _balance_requests into decimal-adjusted balances."""
+        if self.multicall is not None:
+            (results,) = self.w3.codec.decode(["(bool,bytes)[]"], HexBytes(results[0]))
+            results = [return_data for _, return_data in results]
+        base_raw, quote_raw = (
+            self.w3.codec.decode(["uint256"], HexBytes(result))[0] for result in results
+        )
+        
+        base_balance = float(base_raw) / self._base_unit
+        quote_balance = float(quote_raw) / self._quote_unit
+        
+        logger.debug(
+            f"Balances: {base_balance:.6f} {self.base_symbol}, "
+            f"{quote_balance:.6f} {self.quote_symbol}"
+        )
+        
+        return {
+            "base": base_balance,
+            "quote": quote_balance,
+        }
+    
+    def _decode_price(self, raw: Any) -> float:
+        """Decode the raw result of _price_request into quote per base."""
+        (amounts,) = self.w3.codec.decode(["uint256[]"], HexBytes(raw))
+        
+        # amounts[1] is quote out for 1 base in
+        price = float(amounts[1]) / self._quote_unit
+        
+        logger.debug(f"Current price: {price:.6f} {self.quote_symbol}/{self.base_symbol}")
+        return price
     
     def get_balances(self) -> Dict[str, float]:
         """
@@ -124,25 +877,8 @@ class DexClient:
         Returns balances adjusted for decimals.
         """
         try:
-            base_raw = self._rpc_call_with_retry(
-                lambda: self.base_token.functions.balanceOf(self.wallet_address).call()
-            )
-            quote_raw = self._rpc_call_with_retry(
-                lambda: self.quote_token.functions.balanceOf(self.wallet_address).call()
-            )
-            
-            base_balance = float(base_raw) / (10 ** self.base_decimals)
-            quote_balance = float(quote_raw) / (10 ** self.quote_decimals)
-            
-            logger.debug(
-                f"Balances: {base_balance:.6f} {self.base_symbol}, "
-                f"{quote_balance:.6f} {self.quote_symbol}"
-            )
-            
-            return {
-                "base": base_balance,
-                "quote": quote_balance,
-            }
+            results = self._rpc_call_with_retry(self._batch_rpc, self._balance_requests)
+            return self._decode_balances(results)
         except Exception as e:
             logger.error(f"Failed to fetch balances: {e}")
             raise
@@ -153,50 +889,116 @@ class DexClient:
         Uses router's getAmountsOut for a small test amount.
         """
         try:
-            # Use 1 unit of base token for price estimation
-            amount_in = 10 ** self.base_decimals
-            
-            amounts = self._rpc_call_with_retry(
-                lambda: self.router.functions.getAmountsOut(
-                    amount_in,
-                    [config.BASE_TOKEN_ADDRESS, config.QUOTE_TOKEN_ADDRESS]
-                ).call()
-            )
-            
-            # amounts[1] is quote out for 1 base in
-            price = float(amounts[1]) / (10 ** self.quote_decimals)
-            
-            logger.debug(f"Current price: {price:.6f} {self.quote_symbol}/{self.base_symbol}")
-            return price
-            
+            # Quote 1 unit of base token using the pre-encoded getAmountsOut call
+            (raw,) = self._rpc_call_with_retry(self._batch_rpc, [self._price_request])
+            return self._decode_price(raw)
         except Exception as e:
             logger.error(f"Failed to get price: {e}")
             raise
     
+    def get_balances_and_price(self) -> Tuple[Dict[str, float], float]:
+        """
+        Get wallet balances and the current price in one round trip.
+        Same results as get_balances() and get_price(), sent as one batch.
+        """
+        try:
+            *balance_results, price_raw = self._rpc_call_with_retry(
+                self._batch_rpc, self._balance_requests + [self._price_request]
+            )
+            return self._decode_balances(balance_results), self._decode_price(price_raw)
+        except Exception as e:
+            logger.error(f"Failed to fetch balances and price: {e}")
+            raise
+    
+    def quote_sell(self, notional_quote_equiv: float) -> Dict[str, Any]:
+        """
+        Quote a SELL of base tokens for a target quote amount via getAmountsIn.
+        
+        The result can be passed to swap_exact_base_for_quote() as ``quote``
+        so the swap skips its own router call while the quote is fresh.
+        
+        Returns:
+            dict with 'amount_in' (base), 'amount_out' (quote), raw 'amounts'
+            and the monotonic 'quoted_at' time
+        """
+        target_out = int(notional_quote_equiv * self._quote_unit)
+        (amounts,) = self._batch_contract_calls(
+            self.router.functions.getAmountsIn(target_out, self._sell_path)
+        )
+        return {
+            'amount_in': float(amounts[0]) / self._base_unit,
+            'amount_out': float(amounts[-1]) / self._quote_unit,
+            'amounts': list(amounts),
+            'quoted_at': time.monotonic(),
+        }
+    
+    def get_two_way_quotes(
+        self,
+        amount_quote_in: int,
+        amount_base_in: int
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Quote both swap directions from the same block (e.g. for spreads):
+        one Multicall3 call, or without Multicall3 two eth_calls pinned to
+        the current block number.
+        
+        Args:
+            amount_quote_in: Raw quote token amount to quote a BUY for
+            amount_base_in: Raw base token amount to quote a SELL for
+        
+        Returns:
+            Tuple of (buy_amounts, sell_amounts) from getAmountsOut
+        """
+        buy_quote = self.router.functions.getAmountsOut(amount_quote_in, self._buy_path)
+        sell_quote = self.router.functions.getAmountsOut(amount_base_in, self._sell_path)
+        if self.multicall is not None:
+            buy_amounts, sell_amounts = self._aggregate_calls(buy_quote, sell_quote)
+        else:
+            # Separate eth_calls at "latest" may land on different blocks
+            # (or nodes), so pin both to one block number
+            block = hex(self._rpc_call_with_retry(self.w3.eth.get_block_number))
+            buy_amounts, sell_amounts = self._batch_contract_calls(
+                buy_quote, sell_quote, block=block
+            )
+        return list(buy_amounts), list(sell_amounts)
+    
     def ensure_allowance(self, token_address: str, amount: int) -> Optional[str]:
         """
         Check token allowance to router and approve if needed.
         Returns transaction hash if approval was sent, None otherwise.
         """
-        token_address = Web3.to_checksum_address(token_address)
-        router_address = Web3.to_checksum_address(config.DEX_ROUTER_ADDRESS)
+        token_address = _to_checksum_address(token_address)
+        router_address = self._router_address
+        
+        # Skip the on-chain read while a recent check still covers this amount
+        # (unlimited approvals are trusted until a swap fails). The cached value
+        # is debited locally since the swap spends it.
+        cache_key = f"{self.chain_id}:{self.wallet_address}:{token_address}:{router_address}"
+        with self._allowance_lock:
+            cached = self._allowance_cache.get(cache_key)
+            if (
+                cached is not None
+                and cached["allowance"] >= amount
+                and (
+                    cached["allowance"] >= UNLIMITED_ALLOWANCE
+                    or time.time() - cached["checked_at"] < config.ALLOWANCE_CACHE_TTL
+                )
+            ):
+                cached["allowance"] -= amount
+                logger.debug(f"Allowance cached for {token_address}: {cached['allowance']}")
+                return None
         
         # Get token contract
-        token = self.w3.eth.contract(
-            address=token_address,
-            abi=self._load_abi("erc20.json")
-        )
+        token = self._token_contract(token_address)
         
         # Check current allowance with retry
-        current_allowance = self._rpc_call_with_retry(
-            lambda: token.functions.allowance(
-                self.wallet_address,
-                router_address
-            ).call()
+        (current_allowance,) = self._batch_contract_calls(
+            token.functions.allowance(self.wallet_address, router_address)
         )
         
         if current_allowance >= amount:
             logger.debug(f"Sufficient allowance already exists: {current_allowance}")
+            self._remember_allowance(cache_key, current_allowance - amount)
             return None
         
         # Need to approve
@@ -210,22 +1012,19 @@ class DexClient:
             max_approval
         ).build_transaction({
             'from': self.wallet_address,
-            'nonce': self.w3.eth.get_transaction_count(self.wallet_address),
+            'chainId': self.chain_id,
             'gas': config.GAS_LIMIT,
-            'gasPrice': self._get_gas_price(),
+            **self._fee_fields(self._rpc_call_with_retry(self._batch_rpc, self._fee_requests())),
         })
         
-        # Sign and send
-        signed_tx = self.account.sign_transaction(approve_tx)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        
-        # Wait for confirmation
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
+        # Sign, send and wait for confirmation
+        tx_hash, receipt = self._send_transaction(approve_tx, "approval")
         
         if receipt['status'] != 1:
             raise Exception(f"Approval transaction failed: {tx_hash.hex()}")
         
         logger.info(f"Approval successful: {tx_hash.hex()}")
+        self._remember_allowance(cache_key, max_approval - amount)
         return tx_hash.hex()
     
     def _parse_swap_amounts_from_receipt(
@@ -245,15 +1044,14 @@ class DexClient:
         Returns:
             Tuple of (actual_amount_in, actual_amount_out) in raw token units
         """
-        token_in_address = Web3.to_checksum_address(token_in_address)
-        token_out_address = Web3.to_checksum_address(token_out_address)
-        wallet_address = Web3.to_checksum_address(self.wallet_address)
-        
-        # Load ERC20 ABI to decode Transfer events
-        erc20_abi = self._load_abi("erc20.json")
+        token_in_address = _to_checksum_address(token_in_address)
+        token_out_address = _to_checksum_address(token_out_address)
+        wallet_address = self.wallet_address
         
-        # Get Transfer event signature
-        transfer_event_signature_hash = self.w3.keccak(text="Transfer(address,address,uint256)")
+        # Compare raw 20-byte addresses in the loop instead of checksummed strings
+        token_in_bytes = bytes(HexBytes(token_in_address))
+        token_out_bytes = bytes(HexBytes(token_out_address))
+        wallet_bytes = bytes(HexBytes(wallet_address))
         
         actual_amount_in = None
         actual_amount_out = None
@@ -262,80 +1060,49 @@ class DexClient:
         input_transfers = []
         output_transfers = []
         
+        # Only logs emitted by the two swapped tokens can matter
+        interesting_tokens = {token_in_bytes, token_out_bytes}
+        
         # Parse all logs in the receipt
         for log in receipt.get('logs', []):
+            # Skip other contracts' logs (pool Syncs/Swaps, intermediate hops) first
+            try:
+                token_bytes = bytes(HexBytes(log['address']))
+            except Exception as e:
+                logger.warning(f"Failed to read log address {log.get('address')}: {e}")
+                continue
+            if token_bytes not in interesting_tokens:
+                continue
+            
             # Check if this is a Transfer event (should have 3 topics: signature, from, to)
             topics = log.get('topics', [])
             if len(topics) != 3:
                 continue
             
-            # Compare event signature (handle both HexBytes and hex strings)
-            topic0 = topics[0]
-            if hasattr(topic0, 'hex'):
-                topic0_hash = topic0.hex()
-            elif isinstance(topic0, bytes):
-                topic0_hash = topic0.hex()
-            else:
-                topic0_hash = str(topic0)
-            
-            if hasattr(transfer_event_signature_hash, 'hex'):
-                sig_hash = transfer_event_signature_hash.hex()
-            elif isinstance(transfer_event_signature_hash, bytes):
-                sig_hash = transfer_event_signature_hash.hex()
-            else:
-                sig_hash = str(transfer_event_signature_hash)
-            
-            if topic0_hash.lower() != sig_hash.lower():
-                continue
-            
-            # Decode Transfer event: Transfer(address indexed from, address indexed to, uint256 value)
-            # Topics contain indexed parameters - extract addresses from them
-            from_topic = topics[1]
-            to_topic = topics[2]
-            
-            # Extract addresses from topics (handle both HexBytes and hex strings)
-            # Addresses are stored as 32-byte values (last 20 bytes are the address)
-            try:
-                if hasattr(from_topic, 'hex'):
-                    from_address = Web3.to_checksum_address('0x' + from_topic.hex()[-40:])
-                elif isinstance(from_topic, bytes):
-                    from_address = Web3.to_checksum_address('0x' + from_topic.hex()[-40:])
-                else:
-                    from_hex = str(from_topic).replace('0x', '')[-40:]
-                    from_address = Web3.to_checksum_address('0x' + from_hex)
-                
-                if hasattr(to_topic, 'hex'):
-                    to_address = Web3.to_checksum_address('0x' + to_topic.hex()[-40:])
-                elif isinstance(to_topic, bytes):
-                    to_address = Web3.to_checksum_address('0x' + to_topic.hex()[-40:])
-                else:
-                    to_hex = str(to_topic).replace('0x', '')[-40:]
-                    to_address = Web3.to_checksum_address('0x' + to_hex)
-            except Exception as e:
-                logger.warning(f"Failed to extract addresses from topics: {e}")
+            # Compare event signature as bytes (topics may be HexBytes or hex strings)
+            if HexBytes(topics[0]) != TRANSFER_TOPIC0:
                 continue
             
-            # Decode the value (non-indexed parameter)
+            # Decode Transfer(address indexed from, address indexed to, uint256 value)
+            # directly: the indexed addresses are the last 20 bytes of topics 1
+            # and 2, and the value is the single 32-byte word in the data field
             try:
-                token_contract = self.w3.eth.contract(address=log['address'], abi=erc20_abi)
-                transfer_event = token_contract.events.Transfer()
-                decoded_log = transfer_event.process_log(log)
-                value = decoded_log['args']['value']
+                from_bytes = HexBytes(topics[1])[-20:]
+                to_bytes = HexBytes(topics[2])[-20:]
+                value = int.from_bytes(HexBytes(log['data'])[-32:], 'big')
             except Exception as e:
                 logger.warning(f"Failed to decode Transfer event from {log['address']}: {e}")
                 continue
             
-            token_address = Web3.to_checksum_address(log['address'])
-            
             # Check if this is our input token being sent FROM our wallet
-            if token_address == token_in_address and from_address == wallet_address:
+            if token_bytes == token_in_bytes and from_bytes == wallet_bytes:
                 input_transfers.append(value)
-                logger.debug(f"Found input token transfer: {value} from {token_in_address} to {to_address}")
+                logger.debug(f"Found input token transfer: {value} from {token_in_address} to {to_bytes.hex()}")
             
             # Check if this is our output token being received TO our wallet
-            if token_address == token_out_address and to_address == wallet_address:
+            if token_bytes == token_out_bytes and to_bytes == wallet_bytes:
                 output_transfers.append(value)
-                logger.debug(f"Found output token transfer: {value} from {from_address} to {wallet_address}")
+                logger.debug(f"Found output token transfer: {value} from {from_bytes.hex()} to {wallet_address}")
         
         # Take the largest transfer if multiple found (should only be one, but be safe)
         if input_transfers:
@@ -393,81 +1160,87 @@ class DexClient:
         logger.info(f"BUY: Swapping {notional_quote} {self.quote_symbol} for {self.base_symbol}")
         
         # Convert to token units
-        amount_in = int(notional_quote * (10 ** self.quote_decimals))
+        amount_in = int(notional_quote * self._quote_unit)
         
-        # Ensure allowance
-        self.ensure_allowance(config.QUOTE_TOKEN_ADDRESS, amount_in)
-        
-        # Get expected output amount with retry
-        amounts = self._rpc_call_with_retry(
-            lambda: self.router.functions.getAmountsOut(
-                amount_in,
-                [config.QUOTE_TOKEN_ADDRESS, config.BASE_TOKEN_ADDRESS]
-            ).call()
+        # Ensure allowance on a worker while the pre-trade reads are in flight
+        allowance_check = self._allowance_pool.submit(
+            self.ensure_allowance, self._quote_address, amount_in
         )
         
+        # Quote and fee data in one batched round-trip
+        try:
+            amounts, fee_fields = self._read_swap_inputs(
+                self.router.functions.getAmountsOut(
+                    amount_in,
+                    self._buy_path
+                )
+            )
+        except Exception:
+            # The swap is abandoned: drop the check if it hasn't started,
+            # otherwise let any approval it sent finish before the next trade
+            if not allowance_check.cancel():
+                wait([allowance_check])
+            raise
+        
+        # Any approval must be mined before the swap takes the next nonce
+        allowance_check.result()
+        
         expected_out = amounts[1]
         
         # Calculate minimum output with slippage
-        slippage_multiplier = Decimal(10000 - slippage_bps) / Decimal(10000)
-        amount_out_min = int(Decimal(expected_out) * slippage_multiplier)
+        amount_out_min = expected_out * (10000 - slippage_bps) // 10000
         
         logger.info(
-            f"Expected: {float(expected_out) / (10 ** self.base_decimals):.6f} {self.base_symbol}, "
-            f"Min: {float(amount_out_min) / (10 ** self.base_decimals):.6f} {self.base_symbol}"
+            f"Expected: {float(expected_out) / self._base_unit:.6f} {self.base_symbol}, "
+            f"Min: {float(amount_out_min) / self._base_unit:.6f} {self.base_symbol}"
         )
         
-        # Build swap transaction
-        deadline = self.w3.eth.get_block('latest')['timestamp'] + 300  # 5 min deadline
+        # Build swap transaction (wall clock is close enough given the buffer)
+        deadline = int(time.time()) + SWAP_DEADLINE_SECONDS
         
         swap_tx = self.router.functions.swapExactTokensForTokens(
             amount_in,
             amount_out_min,
-            [config.QUOTE_TOKEN_ADDRESS, config.BASE_TOKEN_ADDRESS],
+            self._buy_path,
             self.wallet_address,
             deadline
         ).build_transaction({
             'from': self.wallet_address,
-            'nonce': self.w3.eth.get_transaction_count(self.wallet_address),
+            'chainId': self.chain_id,
             'gas': config.GAS_LIMIT,
-            'gasPrice': self._get_gas_price(),
+            **fee_fields,
         })
         
-        # Sign and send
-        signed_tx = self.account.sign_transaction(swap_tx)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        
-        logger.info(f"BUY transaction sent: {tx_hash.hex()}")
-        
-        # Wait for confirmation
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
+        # Sign, send and wait for confirmation
+        tx_hash, receipt = self._send_transaction(swap_tx, "BUY", private=True)
         
         if receipt['status'] != 1:
+            self._forget_allowance(self._quote_address)
             raise Exception(f"Swap transaction failed: {tx_hash.hex()}")
         
         # Parse actual amounts from transaction logs
         actual_amount_in_raw, actual_amount_out_raw = self._parse_swap_amounts_from_receipt(
             receipt,
-            config.QUOTE_TOKEN_ADDRESS,
-            config.BASE_TOKEN_ADDRESS
+            self._quote_address,
+            self._base_address
         )
         
         # Use parsed amounts if available, otherwise fall back to expected (shouldn't happen)
         if actual_amount_in_raw is not None and actual_amount_out_raw is not None:
-            actual_in = float(actual_amount_in_raw) / (10 ** self.quote_decimals)
-            actual_out = float(actual_amount_out_raw) / (10 ** self.base_decimals)
+            actual_in = float(actual_amount_in_raw) / self._quote_unit
+            actual_out = float(actual_amount_out_raw) / self._base_unit
             logger.info(f"Parsed actual amounts: {actual_in:.6f} {self.quote_symbol} -> {actual_out:.6f} {self.base_symbol}")
         else:
             # Fallback to expected amounts (CRITICAL: This should not happen in production)
             logger.error(
                 f"⚠️ CRITICAL: Could not parse actual amounts from transaction {tx_hash.hex()}. "
                 f"Using expected amounts instead. This indicates a problem with log parsing. "
-                f"Expected: {float(amount_in) / (10 ** self.quote_decimals):.6f} {self.quote_symbol} -> "
-                f"{float(expected_out) / (10 ** self.base_decimals):.6f} {self.base_symbol}. "
+                f"Expected: {float(amount_in) / self._quote_unit:.6f} {self.quote_symbol} -> "
+                f"{float(expected_out) / self._base_unit:.6f} {self.base_symbol}. "
                 f"Transaction was successful but amounts may be inaccurate."
             )
-            actual_in = float(amount_in) / (10 ** self.quote_decimals)
-            actual_out = float(expected_out) / (10 ** self.base_decimals)
+            actual_in = float(amount_in) / self._quote_unit
+            actual_out = float(expected_out) / self._base_unit
         
         gas_used = receipt['gasUsed']
         gas_price_gwei = float(receipt['effectiveGasPrice']) / 1e9
@@ -490,7 +1263,8 @@ class DexClient:
     def swap_exact_base_for_quote(
         self,
         notional_quote_equiv: float,
-        slippage_bps: int
+        slippage_bps: int,
+        quote: Optional[Dict[str, Any]] = None
     ) -> Dict[str, any]:
         """
         SELL: Swap base tokens for quote tokens.
@@ -498,91 +1272,88 @@ class DexClient:
         Args:
             notional_quote_equiv: Approximate quote value to sell (in human-readable units)
             slippage_bps: Slippage tolerance in basis points
+            quote: Optional result of quote_sell() for the same notional; reused
+                instead of a new getAmountsIn call if younger than QUOTE_MAX_AGE
         
         Returns:
             dict with 'amount_in', 'amount_out', 'tx_hash', 'gas_used', 'gas_price_gwei'
         """
         logger.info(f"SELL: Swapping ~{notional_quote_equiv} {self.quote_symbol} worth of {self.base_symbol}")
         
-        # Estimate base amount needed using current price
-        price = self.get_price()
-        base_amount = notional_quote_equiv / price
-        amount_in = int(base_amount * (10 ** self.base_decimals))
-        
-        # Ensure allowance
-        self.ensure_allowance(config.BASE_TOKEN_ADDRESS, amount_in)
-        
-        # Get expected output amount with retry
-        amounts = self._rpc_call_with_retry(
-            lambda: self.router.functions.getAmountsOut(
-                amount_in,
-                [config.BASE_TOKEN_ADDRESS, config.QUOTE_TOKEN_ADDRESS]
-            ).call()
+        # Size the sell with the router's inverse quote: getAmountsIn returns the
+        # base amount needed for the target quote output in a single eth_call.
+        # Batched with fee data in one round-trip.
+        target_out = int(notional_quote_equiv * self._quote_unit)
+        if quote is not None and quote['amounts'][-1] != target_out:
+            quote = None  # quoted for a different notional
+        amounts, fee_fields = self._read_swap_inputs(
+            self.router.functions.getAmountsIn(
+                target_out,
+                self._sell_path
+            ),
+            quote
         )
         
-        expected_out = amounts[1]
+        amount_in, expected_out = amounts[0], amounts[-1]
+        
+        # Ensure allowance
+        self.ensure_allowance(self._base_address, amount_in)
         
         # Calculate minimum output with slippage
-        slippage_multiplier = Decimal(10000 - slippage_bps) / Decimal(10000)
-        amount_out_min = int(Decimal(expected_out) * slippage_multiplier)
+        amount_out_min = expected_out * (10000 - slippage_bps) // 10000
         
         logger.info(
-            f"Selling {float(amount_in) / (10 ** self.base_decimals):.6f} {self.base_symbol}, "
-            f"Expected: {float(expected_out) / (10 ** self.quote_decimals):.6f} {self.quote_symbol}, "
-            f"Min: {float(amount_out_min) / (10 ** self.quote_decimals):.6f} {self.quote_symbol}"
+            f"Selling {float(amount_in) / self._base_unit:.6f} {self.base_symbol}, "
+            f"Expected: {float(expected_out) / self._quote_unit:.6f} {self.quote_symbol}, "
+            f"Min: {float(amount_out_min) / self._quote_unit:.6f} {self.quote_symbol}"
         )
         
         # Build swap transaction
-        deadline = self.w3.eth.get_block('latest')['timestamp'] + 300
+        deadline = int(time.time()) + SWAP_DEADLINE_SECONDS
         
         swap_tx = self.router.functions.swapExactTokensForTokens(
             amount_in,
             amount_out_min,
-            [config.BASE_TOKEN_ADDRESS, config.QUOTE_TOKEN_ADDRESS],
+            self._sell_path,
             self.wallet_address,
             deadline
         ).build_transaction({
             'from': self.wallet_address,
-            'nonce': self.w3.eth.get_transaction_count(self.wallet_address),
+            'chainId': self.chain_id,
             'gas': config.GAS_LIMIT,
-            'gasPrice': self._get_gas_price(),
+            **fee_fields,
         })
         
-        # Sign and send
-        signed_tx = self.account.sign_transaction(swap_tx)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        
-        logger.info(f"SELL transaction sent: {tx_hash.hex()}")
-        
-        # Wait for confirmation
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=300)
+        # Sign, send and wait for confirmation
+        tx_hash, receipt = self._send_transaction(swap_tx, "SELL", private=True)
         
         if receipt['status'] != 1:
+            self._forget_allowance(self._base_address)
             raise Exception(f"Swap transaction failed: {tx_hash.hex()}")
         
         # Parse actual amounts from transaction logs
         actual_amount_in_raw, actual_amount_out_raw = self._parse_swap_amounts_from_receipt(
             receipt,
-            config.BASE_TOKEN_ADDRESS,
-            config.QUOTE_TOKEN_ADDRESS
+            self._base_address,
+            self._quote_address
         )
         
         # Use parsed amounts if available, otherwise fall back to expected (shouldn't happen)
         if actual_amount_in_raw is not None and actual_amount_out_raw is not None:
-            actual_in = float(actual_amount_in_raw) / (10 ** self.base_decimals)
-            actual_out = float(actual_amount_out_raw) / (10 ** self.quote_decimals)
+            actual_in = float(actual_amount_in_raw) / self._base_unit
+            actual_out = float(actual_amount_out_raw) / self._quote_unit
             logger.info(f"Parsed actual amounts: {actual_in:.6f} {self.base_symbol} -> {actual_out:.6f} {self.quote_symbol}")
         else:
             # Fallback to expected amounts (CRITICAL: This should not happen in production)
             logger.error(
                 f"⚠️ CRITICAL: Could not parse actual amounts from transaction {tx_hash.hex()}. "
                 f"Using expected amounts instead. This indicates a problem with log parsing. "
-                f"Expected: {float(amount_in) / (10 ** self.base_decimals):.6f} {self.base_symbol} -> "
-                f"{float(expected_out) / (10 ** self.quote_decimals):.6f} {self.quote_symbol}. "
+                f"Expected: {float(amount_in) / self._base_unit:.6f} {self.base_symbol} -> "
+                f"{float(expected_out) / self._quote_unit:.6f} {self.quote_symbol}. "
                 f"Transaction was successful but amounts may be inaccurate."
             )
-            actual_in = float(amount_in) / (10 ** self.base_decimals)
-            actual_out = float(expected_out) / (10 ** self.quote_decimals)
+            actual_in = float(amount_in) / self._base_unit
+            actual_out = float(expected_out) / self._quote_unit
         
         gas_used = receipt['gasUsed']
         gas_price_gwei = float(receipt['effectiveGasPrice']) / 1e9
@@ -601,10 +1372,3 @@ class DexClient:
         )
         
         return result
-    
-    def _get_gas_price(self) -> int:
-        """Get gas price in wei."""
-        if config.GAS_PRICE_GWEI:
-            return self.w3.to_wei(config.GAS_PRICE_GWEI, 'gwei')
-        else:
-            return self.w3.eth.gas_price
@@ -3,25 +3,34 @@ Main Telegram bot application.
 Handles user commands and manages trading sessions.
 """
 
+import atexit
 import logging
 import sys
 import asyncio
-import signal
+import math
+import time
 import queue as queue_module
-from typing import Optional, Dict
+from dataclasses import dataclass, replace
+from typing import Optional, Dict, Tuple
 from collections import defaultdict
-from datetime import datetime, timedelta
-from logging.handlers import RotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
-from telegram import Update
+import orjson
+from telegram import MessageEntity, Update
+from telegram.constants import ParseMode
+from telegram.error import TelegramError
 from telegram.ext import (
     Application,
+    ApplicationHandlerStop,
     CommandHandler,
     ContextTypes,
     ConversationHandler,
     MessageHandler,
     filters,
 )
+from telegram.helpers import escape_markdown
+from telegram.request import HTTPXRequest
 
 from .config import config
 from .db import Database
@@ -49,11 +58,18 @@ else:
 
 file_handler.setFormatter(formatter)
 
-# Configure root logger
+# Configure root logger. Records are only enqueued on the calling thread;
+# the listener thread formats them and does the console and file writes.
+log_queue: queue_module.Queue = queue_module.Queue(-1)
+log_listener = QueueListener(log_queue, console_handler, file_handler)
+log_listener.start()
+# Drain queued records on any interpreter exit (including sys.exit after a
+# startup failure); the listener thread is a daemon and would drop them
+atexit.register(log_listener.stop)
+
 root_logger = logging.getLogger()
 root_logger.setLevel(getattr(logging, config.LOG_LEVEL))
-root_logger.addHandler(console_handler)
-root_logger.addHandler(file_handler)
+root_logger.addHandler(QueueHandler(log_queue))
 
 logger = logging.getLogger(__name__)
 
@@ -66,113 +82,327 @@ dex_client: DexClient
 session_runner: SessionRunner
 application: Application
 
-# Rate limiting: track command usage per user
-rate_limit_tracker: Dict[int, list] = defaultdict(list)
+# Authorized Telegram user IDs (config is immutable, so bind the set once)
+AUTHORIZED_IDS = config.ALLOWED_TELEGRAM_IDS
+
+# Longer numeric input is rejected before parsing (no valid setting needs more)
+MAX_NUMBER_INPUT_LENGTH = 32
+
+# Rate limiting: user_id -> (tokens left, monotonic time of last refill)
+rate_limit_tracker: Dict[int, Tuple[float, float]] = {}
+
+# /status reuses on-chain reads this recent (seconds)
+STATUS_CACHE_TTL = 2.0
+
+# (monotonic fetch time, balances, price) of the last on-chain read
+_chain_snapshot: Optional[Tuple[float, Dict[str, float], float]] = None
+
+# A user's /status reply is resent as-is while their session is unchanged and
+# the reply is younger than this (seconds), skipping the on-chain read
+STATUS_REPLY_TTL = 10.0
+
+# user_id -> (session hash, monotonic build time, formatted /status reply)
+_last_status: Dict[int, Tuple[int, float, str]] = {}
+
+# Static /help reply
+HELP_TEXT = (
+    "🤖 **DEX Trading Bot - Help**\n\n"
+    "This bot executes automated trades with a fixed 2×2 pattern:\n"
+    "BUY → BUY → SELL → SELL (repeating)\n\n"
+    "**Commands:**\n"
+    "/config - Set up trading parameters\n"
+    "/setpct <value> - Update trade percentage\n"
+    "/setinterval <seconds> - Update trade interval\n"
+    "/start - Start trading session\n"
+    "/stop - Stop trading session\n"
+    "/status - Show current status\n"
+    "/history [limit] - Show recent trade history (default: 10, max: 50)\n"
+    "/reset - Reset session state (clears statistics)\n"
+    "/help - Show this help message\n\n"
+    "⚠️ **Important:**\n"
+    "This bot is designed for legitimate DCA (Dollar Cost Averaging) "
+    "execution only. It trades from a single wallet and is NOT intended "
+    "for wash trading, volume manipulation, or market spoofing.\n\n"
+    "Users are responsible for compliance with all applicable laws "
+    "and regulations in their jurisdiction."
+)
 
+# /status reply in MarkdownV2, filled with str.format_map. The static text
+# needs no escaping; values are formatted and escaped by _md_value.
+STATUS_TEMPLATE = (
+    "{status_emoji} Session Status: *{status_text}*\n\n"
+    "📊 Configuration:\n"
+    "• Total Liquidity: {total_liquidity}\n"
+    "• Trade %: {trade_pct}%\n"
+    "• Trade Amount: {trade_amount}\n"
+    "• Interval: {interval_seconds}s\n\n"
+    "📈 Statistics:\n"
+    "• Trades Executed: {trades_executed}\n"
+    "• Quote Spent: {spent_notional}\n"
+    "• Quote Received: {received_quote}\n"
+    "• Net Quote P/L: {net_quote}\n"
+    "• Base Position Δ: {base_position_delta}\n"
+    "• Next Trade: {current_side}\n\n"
+    "💰 Current Balances:\n"
+    "• Base: {base_balance}\n"
+    "• Quote: {quote_balance}\n"
+    "• Price: {price}\n\n"
+    "Pattern: BUY → BUY → SELL → SELL"
+)
+
+# Threads behind asyncio.to_thread. Each one mostly waits on an RPC or SQLite
+# call, so the pool is sized well above the default min(32, cpus + 4).
+BLOCKING_IO_WORKERS = 64
+
+# Outgoing messages as (chat_id, text, send_message kwargs). Handlers enqueue
+# and return; outbox_worker sends within Telegram's ~30 messages/s bot limit.
+OUTBOX_RATE_PER_SECOND = 30
+outbox: asyncio.Queue = asyncio.Queue()
+
+# Messages for the same chat drained in one batch are joined with
+# MESSAGE_SEPARATOR, up to Telegram's 4096-character message limit
+MAX_MESSAGE_LENGTH = 4096
+MESSAGE_SEPARATOR = "\n\n"
+_outbox_task: Optional[asyncio.Task] = None
+
+
+@dataclass(slots=True)
+class _ConfigDraft:
+    """Answers collected so far in a /config conversation (one user_data entry)."""
+    
+    total_liquidity: float = 0.0
+    trade_pct: float = 0.0
+
+
+class OrjsonHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest that parses Telegram's JSON responses (incoming updates) with orjson."""
+    
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> dict:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError as exc:
+            logger.error(f"Can not load invalid JSON data: {payload!r}")
+            raise TelegramError("Invalid server response") from exc
+
+
+def reply(update: Update, text: str, **kwargs) -> None:
+    """Queue a message to the chat an update came from."""
+    outbox.put_nowait((update.effective_chat.id, text, kwargs))
+
+
+def reply_if_session_running(update: Update, user_id: int, active_text: str) -> bool:
+    """
+    Reply and return True if the user's session loop is still running: with
+    active_text while it trades, or with a short notice while a stopped
+    session finishes its last trade.
+    """
+    if session_runner.is_session_active(user_id):
+        reply(update, active_text)
+        return True
+    if session_runner.is_session_stopping(user_id):
+        reply(
+            update,
+            "⏳ The session is stopping and will finish after its current trade.\n"
+            "Please try again in a moment."
+        )
+        return True
+    return False
 
-def check_authorization(func):
-    """Decorator to check if user is authorized."""
-    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
-        user_id = update.effective_user.id
-        if not config.is_authorized_user(user_id):
-            await update.message.reply_text(
-                "❌ You are not authorized to use this bot."
-            )
-            logger.warning(f"Unauthorized access attempt from user {user_id}")
-            return
-        return await func(update, context)
-    return wrapper
+
+def deliver_session_message(user_id: int, message: str) -> None:
+    """Queue a session notification (called on the loop via call_soon_threadsafe)."""
+    outbox.put_nowait((user_id, message, {}))
+
+
+def _coalesce_messages(messages: list) -> list:
+    """
+    Join consecutive messages with the same send options into as few texts
+    as fit in one Telegram message, keeping their order. Messages carrying
+    explicit entities are never joined (their offsets would shift).
+    """
+    merged = []
+    for text, kwargs in messages:
+        if merged:
+            last_text, last_kwargs = merged[-1]
+            combined_length = len(last_text) + len(MESSAGE_SEPARATOR) + len(text)
+            mergeable = last_kwargs == kwargs and "entities" not in kwargs
+            if mergeable and combined_length <= MAX_MESSAGE_LENGTH:
+                merged[-1] = (last_text + MESSAGE_SEPARATOR + text, kwargs)
+                continue
+        merged.append((text, kwargs))
+    return merged
+
+
+async def _send_chat_messages(bot, chat_id: int, messages: list) -> None:
+    """Send one chat's queued messages in order, coalesced into as few sends as fit."""
+    for text, kwargs in _coalesce_messages(messages):
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        except Exception as e:
+            logger.error(f"Error sending message to chat {chat_id}: {e}")
+
+
+async def outbox_worker(bot) -> None:
+    """
+    Drain the outbox for the lifetime of the bot.
+    
+    Takes up to OUTBOX_RATE_PER_SECOND queued messages at a time and sends
+    them concurrently across chats (in order within a chat), then paces the
+    next batch so the overall rate stays under the limit.
+    """
+    while True:
+        batch = [await outbox.get()]
+        while len(batch) < OUTBOX_RATE_PER_SECOND and not outbox.empty():
+            batch.append(outbox.get_nowait())
+        
+        started = time.monotonic()
+        by_chat: Dict[int, list] = defaultdict(list)
+        for chat_id, text, kwargs in batch:
+            by_chat[chat_id].append((text, kwargs))
+        await asyncio.gather(*(
+            _send_chat_messages(bot, chat_id, messages)
+            for chat_id, messages in by_chat.items()
+        ))
+        for _ in batch:
+            outbox.task_done()
+        
+        pause = len(batch) / OUTBOX_RATE_PER_SECOND - (time.monotonic() - started)
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+
+async def post_init(app: Application) -> None:
+    """Start background tasks once the application is initialized."""
+    global _outbox_task
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+    )
+    _outbox_task = asyncio.create_task(outbox_worker(app.bot))
+    session_runner.attach_loop(asyncio.get_running_loop(), deliver_session_message)
+
+
+async def post_stop(app: Application) -> None:
+    """
+    Stop active trading sessions, then flush pending messages (briefly) and
+    stop the outbox worker. PTB runs this on the event loop after a stop
+    signal (SIGINT/SIGTERM/SIGABRT) or Application.stop_running().
+    """
+    active_user_ids = session_runner.active_user_ids()
+    if active_user_ids:
+        logger.info(f"Stopping {len(active_user_ids)} active sessions...")
+        await asyncio.gather(*(
+            asyncio.to_thread(session_runner.stop_session, user_id)
+            for user_id in active_user_ids
+        ))
+    
+    if _outbox_task is None:
+        return
+    try:
+        await asyncio.wait_for(outbox.join(), timeout=5)
+    except asyncio.TimeoutError:
+        logger.warning(f"Dropping {outbox.qsize()} unsent messages on shutdown")
+    _outbox_task.cancel()
+
+
+async def reject_unauthorized(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Drop an update from an unauthorized user before any other handler runs.
+    Registered once in handler group -1 behind a filters.User check, so
+    authorized updates never schedule this callback.
+    """
+    user = update.effective_user if isinstance(update, Update) else None
+    if user is not None:
+        logger.warning(f"Unauthorized access attempt from user {user.id}")
+        if update.effective_chat is not None:
+            reply(update, "❌ You are not authorized to use this bot.")
+    raise ApplicationHandlerStop
 
 
 def check_rate_limit(func):
-    """Decorator to enforce rate limiting on commands."""
+    """
+    Decorator to enforce rate limiting on commands.
+    Token bucket per user: RATE_LIMIT_PER_MINUTE tokens, refilled continuously.
+    Skipped entirely (handler returned unwrapped) when only one Telegram ID is
+    allowed, unless RATE_LIMIT_SINGLE_USER is set.
+    """
+    if len(AUTHORIZED_IDS) == 1 and not config.RATE_LIMIT_SINGLE_USER:
+        # Single-operator deployment: no other users to protect, so don't wrap
+        return func
+    
+    capacity = float(config.RATE_LIMIT_PER_MINUTE)
+    refill_per_second = capacity / 60.0
+    
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        now = datetime.utcnow()
+        now = time.monotonic()
         
-        # Clean old entries (older than 1 minute)
-        if user_id in rate_limit_tracker:
-            rate_limit_tracker[user_id] = [
-                ts for ts in rate_limit_tracker[user_id]
-                if now - ts < timedelta(minutes=1)
-            ]
+        tokens, last = rate_limit_tracker.get(user_id, (capacity, now))
+        tokens = min(capacity, tokens + (now - last) * refill_per_second)
         
         # Check rate limit
-        if len(rate_limit_tracker[user_id]) >= config.RATE_LIMIT_PER_MINUTE:
-            await update.message.reply_text(
+        if tokens < 1:
+            rate_limit_tracker[user_id] = (tokens, now)
+            reply(
+                update,
                 "⚠️ Rate limit exceeded. Please wait a moment before trying again."
             )
             logger.warning(f"Rate limit exceeded for user {user_id}")
             return
         
-        # Record this command
-        rate_limit_tracker[user_id].append(now)
+        # Spend a token for this command
+        rate_limit_tracker[user_id] = (tokens - 1, now)
         
         return await func(update, context)
     return wrapper
 
 
 def validate_float_input(value: str, min_val: float = None, max_val: float = None) -> float:
-    """Validate and parse float input."""
-    try:
-        num = float(value)
-        if min_val is not None and num < min_val:
-            raise ValueError(f"Value must be at least {min_val}")
-        if max_val is not None and num > max_val:
-            raise ValueError(f"Value must be at most {max_val}")
-        return num
-    except ValueError as e:
-        if "could not convert" in str(e).lower():
-            raise ValueError("Invalid number format")
-        raise
+    """Validate and parse float input. Raises ValueError for bad or out-of-range input."""
+    if not value or len(value) > MAX_NUMBER_INPUT_LENGTH:
+        raise ValueError("Invalid number format")
+    num = float(value)
+    if not math.isfinite(num):
+        raise ValueError("Invalid number format")
+    if min_val is not None and num < min_val:
+        raise ValueError(f"Value must be at least {min_val}")
+    if max_val is not None and num > max_val:
+        raise ValueError(f"Value must be at most {max_val}")
+    return num
 
 
 def validate_int_input(value: str, min_val: int = None, max_val: int = None) -> int:
-    """Validate and parse int input."""
-    try:
-        num = int(value)
-        if min_val is not None and num < min_val:
-            raise ValueError(f"Value must be at least {min_val}")
-        if max_val is not None and num > max_val:
-            raise ValueError(f"Value must be at most {max_val}")
-        return num
-    except ValueError as e:
-        if "invalid literal" in str(e).lower():
-            raise ValueError("Invalid integer format")
-        raise
-
-
-async def process_message_queues(context: ContextTypes.DEFAULT_TYPE):
-    """Periodically process message queues from session runner."""
-    try:
-        # Get all active user IDs from session runner
-        for user_id in list(session_runner.message_queues.keys()):
-            if user_id not in session_runner.message_callbacks:
-                continue
-            
-            callback = session_runner.message_callbacks.get(user_id)
-            if not callback:
-                continue
-            
-            queue_obj = session_runner.message_queues.get(user_id)
-            if not queue_obj:
-                continue
-            
-            # Process all queued messages
-            while not queue_obj.empty():
-                try:
-                    message = queue_obj.get_nowait()
-                    # Send message via callback
-                    await callback(message)
-                except queue_module.Empty:
-                    break
-                except Exception as e:
-                    logger.error(f"Error sending message to user {user_id}: {e}")
-    except Exception as e:
-        logger.error(f"Error processing message queues: {e}")
+    """Validate and parse int input. Raises ValueError for bad or out-of-range input."""
+    if not value or len(value) > MAX_NUMBER_INPUT_LENGTH:
+        raise ValueError("Invalid integer format")
+    num = int(value)
+    if min_val is not None and num < min_val:
+        raise ValueError(f"Value must be at least {min_val}")
+    if max_val is not None and num > max_val:
+        raise ValueError(f"Value must be at most {max_val}")
+    return num
+
+
+def _fetch_chain_snapshot() -> Tuple[Dict[str, float], float]:
+    """Read wallet balances and price on-chain (blocking)."""
+    return dex_client.get_balances_and_price()
+
+
+async def get_chain_snapshot() -> Tuple[Dict[str, float], float]:
+    """
+    Return wallet balances and price, reusing a read younger than STATUS_CACHE_TTL.
+    The read runs off the event loop. Updates are handled one at a time, so
+    no second /status can arrive while a read is in flight.
+    """
+    global _chain_snapshot
+    if _chain_snapshot is not None and time.monotonic() - _chain_snapshot[0] < STATUS_CACHE_TTL:
+        return _chain_snapshot[1], _chain_snapshot[2]
+    
+    balances, price = await asyncio.to_thread(_fetch_chain_snapshot)
+    _chain_snapshot = (time.monotonic(), balances, price)
+    return balances, price
 
 
-@check_authorization
 @check_rate_limit
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -187,30 +417,27 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Check if config exists
     user_config = db.get_session_config(user_id)
     if not user_config:
-        await update.message.reply_text(
+        reply(
+            update,
             "❌ No configuration found.\n"
             "Please run /config first to set up your trading parameters."
         )
         return
     
     # Check if already running
-    if session_runner.is_session_active(user_id):
-        await update.message.reply_text(
-            "⚠️ A trading session is already active.\n"
-            "Use /stop to stop it first."
-        )
+    if reply_if_session_running(
+        update,
+        user_id,
+        "⚠️ A trading session is already active.\n"
+        "Use /stop to stop it first."
+    ):
         return
     
-    # Register message callback
-    async def send_message(msg: str):
-        await context.bot.send_message(chat_id=user_id, text=msg)
-    
-    session_runner.register_message_callback(user_id, send_message)
-    
     # Start session
-    if session_runner.start_session(user_id):
+    if await asyncio.to_thread(session_runner.start_session, user_id):
         trade_amount = user_config.get_trade_amount()
-        await update.message.reply_text(
+        reply(
+            update,
             f"✅ Trading session started!\n\n"
             f"📊 Configuration:\n"
             f"• Total Liquidity: {user_config.total_liquidity:.2f}\n"
@@ -223,23 +450,24 @@ async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         )
         logger.info(f"User {user_id} started trading session")
     else:
-        await update.message.reply_text(
+        reply(
+            update,
             "❌ Failed to start trading session.\n"
             "Please check logs or contact support."
         )
 
 
-@check_authorization
 @check_rate_limit
 async def cmd_stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /stop command - stop trading session."""
     user_id = update.effective_user.id
     
-    if session_runner.stop_session(user_id):
+    if await asyncio.to_thread(session_runner.stop_session, user_id):
         session_state = db.get_session_state(user_id)
         net_quote = session_state.get_net_quote()
         
-        await update.message.reply_text(
+        reply(
+            update,
             f"🛑 Trading session stopped.\n\n"
             f"📈 Session Summary:\n"
             f"• Trades Executed: {session_state.trades_executed}\n"
@@ -250,26 +478,28 @@ async def cmd_stop(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         )
         logger.info(f"User {user_id} stopped trading session")
     else:
-        await update.message.reply_text(
+        reply(
+            update,
             "⚠️ No active trading session to stop."
         )
 
 
-@check_authorization
 @check_rate_limit
 async def cmd_config_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle /config command - start configuration conversation."""
     user_id = update.effective_user.id
     
     # Check if session is active
-    if session_runner.is_session_active(user_id):
-        await update.message.reply_text(
-            "⚠️ Cannot change configuration while a session is active.\n"
-            "Please /stop the session first."
-        )
+    if reply_if_session_running(
+        update,
+        user_id,
+        "⚠️ Cannot change configuration while a session is active.\n"
+        "Please /stop the session first."
+    ):
         return ConversationHandler.END
     
-    await update.message.reply_text(
+    reply(
+        update,
         "🔧 Let's configure your trading parameters.\n\n"
         "Please enter your **total liquidity** in quote tokens "
         "(e.g., total USDC available for trading):"
@@ -283,9 +513,10 @@ async def config_liquidity(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         # Validate and sanitize input
         liquidity = validate_float_input(update.message.text.strip(), min_val=0.01, max_val=1e15)
         
-        context.user_data['total_liquidity'] = liquidity
+        context.user_data['_draft'] = _ConfigDraft(total_liquidity=liquidity)
         
-        await update.message.reply_text(
+        reply(
+            update,
             f"✅ Total liquidity: {liquidity:.2f}\n\n"
             f"Now enter the **trade percentage** (% of total liquidity per trade).\n"
             f"For example, enter '2' for 2% ({liquidity * 0.02:.2f} per trade):"
@@ -293,7 +524,8 @@ async def config_liquidity(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         return CONFIG_PCT
         
     except ValueError:
-        await update.message.reply_text(
+        reply(
+            update,
             "❌ Invalid input. Please enter a positive number:"
         )
         return CONFIG_LIQUIDITY
@@ -305,12 +537,14 @@ async def config_pct(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         # Validate and sanitize input
         trade_pct = validate_float_input(update.message.text.strip(), min_val=0.01, max_val=100)
         
-        context.user_data['trade_pct'] = trade_pct
+        draft = context.user_data['_draft']
+        draft.trade_pct = trade_pct
         
-        liquidity = context.user_data['total_liquidity']
+        liquidity = draft.total_liquidity
         trade_amount = liquidity * (trade_pct / 100)
         
-        await update.message.reply_text(
+        reply(
+            update,
             f"✅ Trade percentage: {trade_pct}%\n"
             f"   Trade amount: {trade_amount:.2f}\n\n"
             f"Finally, enter the **interval in seconds** between trades.\n"
@@ -319,7 +553,8 @@ async def config_pct(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         return CONFIG_INTERVAL
         
     except ValueError:
-        await update.message.reply_text(
+        reply(
+            update,
             "❌ Invalid input. Please enter a percentage between 0 and 100:"
         )
         return CONFIG_PCT
@@ -334,18 +569,20 @@ async def config_interval(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         interval = validate_int_input(update.message.text.strip(), min_val=1, max_val=86400)
         
         # Create and save configuration
+        draft = context.user_data['_draft']
         session_config = SessionConfig(
             user_id=user_id,
-            total_liquidity=context.user_data['total_liquidity'],
-            trade_pct=context.user_data['trade_pct'],
+            total_liquidity=draft.total_liquidity,
+            trade_pct=draft.trade_pct,
             interval_seconds=interval,
         )
         
-        db.save_session_config(session_config)
+        await asyncio.to_thread(db.save_session_config, session_config)
         
         trade_amount = session_config.get_trade_amount()
         
-        await update.message.reply_text(
+        reply(
+            update,
             f"✅ Configuration saved!\n\n"
             f"📊 Your Settings:\n"
             f"• Total Liquidity: {session_config.total_liquidity:.2f}\n"
@@ -365,7 +602,8 @@ async def config_interval(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return ConversationHandler.END
         
     except ValueError:
-        await update.message.reply_text(
+        reply(
+            update,
             "❌ Invalid input. Please enter a positive integer (seconds):"
         )
         return CONFIG_INTERVAL
@@ -373,29 +611,30 @@ async def config_interval(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 async def config_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle conversation cancellation."""
-    await update.message.reply_text("❌ Configuration cancelled.")
+    reply(update, "❌ Configuration cancelled.")
     context.user_data.clear()
     return ConversationHandler.END
 
 
-@check_authorization
 @check_rate_limit
 async def cmd_setpct(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /setpct command - update trade percentage."""
     user_id = update.effective_user.id
     
     # Check if session is active
-    if session_runner.is_session_active(user_id):
-        await update.message.reply_text(
-            "⚠️ Cannot change configuration while a session is active.\n"
-            "Please /stop the session first."
-        )
+    if reply_if_session_running(
+        update,
+        user_id,
+        "⚠️ Cannot change configuration while a session is active.\n"
+        "Please /stop the session first."
+    ):
         return
     
     # Check if config exists
     session_config = db.get_session_config(user_id)
     if not session_config:
-        await update.message.reply_text(
+        reply(
+            update,
             "❌ No configuration found. Please run /config first."
         )
         return
@@ -408,43 +647,46 @@ async def cmd_setpct(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
         new_pct = validate_float_input(context.args[0].strip(), min_val=0.01, max_val=100)
         
         # Update config
-        session_config.trade_pct = new_pct
-        db.save_session_config(session_config)
+        session_config = replace(session_config, trade_pct=new_pct)
+        await asyncio.to_thread(db.save_session_config, session_config)
         
         trade_amount = session_config.get_trade_amount()
         
-        await update.message.reply_text(
+        reply(
+            update,
             f"✅ Trade percentage updated to {new_pct}%\n"
             f"   New trade amount: {trade_amount:.2f}"
         )
         logger.info(f"User {user_id} updated trade_pct to {new_pct}%")
         
     except (ValueError, IndexError):
-        await update.message.reply_text(
+        reply(
+            update,
             "❌ Invalid usage.\n"
             "Usage: /setpct <percentage>\n"
             "Example: /setpct 2.5"
         )
 
 
-@check_authorization
 @check_rate_limit
 async def cmd_setinterval(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /setinterval command - update trade interval."""
     user_id = update.effective_user.id
     
     # Check if session is active
-    if session_runner.is_session_active(user_id):
-        await update.message.reply_text(
-            "⚠️ Cannot change configuration while a session is active.\n"
-            "Please /stop the session first."
-        )
+    if reply_if_session_running(
+        update,
+        user_id,
+        "⚠️ Cannot change configuration while a session is active.\n"
+        "Please /stop the session first."
+    ):
         return
     
     # Check if config exists
     session_config = db.get_session_config(user_id)
     if not session_config:
-        await update.message.reply_text(
+        reply(
+            update,
             "❌ No configuration found. Please run /config first."
         )
         return
@@ -457,114 +699,108 @@ async def cmd_setinterval(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         new_interval = validate_int_input(context.args[0].strip(), min_val=1, max_val=86400)
         
         # Update config
-        session_config.interval_seconds = new_interval
-        db.save_session_config(session_config)
+        session_config = replace(session_config, interval_seconds=new_interval)
+        await asyncio.to_thread(db.save_session_config, session_config)
         
-        await update.message.reply_text(
+        reply(
+            update,
             f"✅ Trade interval updated to {new_interval} seconds"
         )
         logger.info(f"User {user_id} updated interval to {new_interval}s")
         
     except (ValueError, IndexError):
-        await update.message.reply_text(
+        reply(
+            update,
             "❌ Invalid usage.\n"
             "Usage: /setinterval <seconds>\n"
             "Example: /setinterval 120"
         )
 
 
-@check_authorization
+def _utf16_len(text: str) -> int:
+    """Length of text in UTF-16 code units, the unit of Telegram entity offsets."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _md_value(value, spec: str = "") -> str:
+    """Format a value and escape it for MarkdownV2 ('.', '+' and '-' are reserved)."""
+    return escape_markdown(format(value, spec), version=2)
+
+
 @check_rate_limit
 async def cmd_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /status command - show current status."""
     user_id = update.effective_user.id
     
-    # Get configuration
-    session_config = db.get_session_config(user_id)
+    # Get configuration and state
+    session_config, session_state = db.get_session_bundle(user_id)
     if not session_config:
-        await update.message.reply_text(
+        reply(
+            update,
             "❌ No configuration found. Please run /config first."
         )
         return
     
-    # Get state
-    session_state = db.get_session_state(user_id)
+    # Resend the previous reply if nothing in the session has changed
+    state_hash = hash((
+        session_state.active,
+        session_state.trades_executed,
+        session_state.spent_notional,
+        session_state.received_quote,
+        session_state.base_position_delta,
+        session_state.pattern_index,
+        session_state.last_error,
+        session_config.total_liquidity,
+        session_config.trade_pct,
+        session_config.interval_seconds,
+    ))
+    cached = _last_status.get(user_id)
+    if cached and cached[0] == state_hash and time.monotonic() - cached[1] < STATUS_REPLY_TTL:
+        reply(update, cached[2], parse_mode=ParseMode.MARKDOWN_V2)
+        return
     
-    # Get balances
+    # Get balances (cached briefly)
     try:
-        balances = dex_client.get_balances()
-        price = dex_client.get_price()
+        balances, price = await get_chain_snapshot()
     except Exception as e:
         logger.error(f"Failed to fetch on-chain data: {e}")
         balances = {"base": 0, "quote": 0}
         price = 0
+        state_hash = None  # don't reuse a reply with placeholder balances
     
     # Build status message
-    status_emoji = "🟢" if session_state.active else "🔴"
-    status_text = "ACTIVE" if session_state.active else "STOPPED"
-    
-    net_quote = session_state.get_net_quote()
-    current_side = session_state.get_current_side()
-    
-    trade_amount = session_config.get_trade_amount()
-    
-    message = (
-        f"{status_emoji} Session Status: **{status_text}**\n\n"
-        f"📊 Configuration:\n"
-        f"• Total Liquidity: {session_config.total_liquidity:.2f}\n"
-        f"• Trade %: {session_config.trade_pct}%\n"
-        f"• Trade Amount: {trade_amount:.2f}\n"
-        f"• Interval: {session_config.interval_seconds}s\n\n"
-        f"📈 Statistics:\n"
-        f"• Trades Executed: {session_state.trades_executed}\n"
-        f"• Quote Spent: {session_state.spent_notional:.2f}\n"
-        f"• Quote Received: {session_state.received_quote:.2f}\n"
-        f"• Net Quote P/L: {net_quote:+.2f}\n"
-        f"• Base Position Δ: {session_state.base_position_delta:+.6f}\n"
-        f"• Next Trade: {current_side}\n\n"
-        f"💰 Current Balances:\n"
-        f"• Base: {balances['base']:.6f}\n"
-        f"• Quote: {balances['quote']:.2f}\n"
-        f"• Price: {price:.6f}\n\n"
-        f"Pattern: BUY → BUY → SELL → SELL"
-    )
+    message = STATUS_TEMPLATE.format_map({
+        "status_emoji": "🟢" if session_state.active else "🔴",
+        "status_text": "ACTIVE" if session_state.active else "STOPPED",
+        "total_liquidity": _md_value(session_config.total_liquidity, ".2f"),
+        "trade_pct": _md_value(session_config.trade_pct),
+        "trade_amount": _md_value(session_config.get_trade_amount(), ".2f"),
+        "interval_seconds": session_config.interval_seconds,
+        "trades_executed": session_state.trades_executed,
+        "spent_notional": _md_value(session_state.spent_notional, ".2f"),
+        "received_quote": _md_value(session_state.received_quote, ".2f"),
+        "net_quote": _md_value(session_state.get_net_quote(), "+.2f"),
+        "base_position_delta": _md_value(session_state.base_position_delta, "+.6f"),
+        "current_side": session_state.get_current_side(),
+        "base_balance": _md_value(balances['base'], ".6f"),
+        "quote_balance": _md_value(balances['quote'], ".2f"),
+        "price": _md_value(price, ".6f"),
+    })
     
     if session_state.last_error:
-        message += f"\n\n⚠️ Last Error:\n{session_state.last_error}"
+        message += f"\n\n⚠️ Last Error:\n{escape_markdown(session_state.last_error, version=2)}"
     
-    await update.message.reply_text(message, parse_mode='Markdown')
+    if state_hash is not None:
+        _last_status[user_id] = (state_hash, time.monotonic(), message)
+    reply(update, message, parse_mode=ParseMode.MARKDOWN_V2)
 
 
-@check_authorization
 @check_rate_limit
 async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /help command - show help message."""
-    help_text = (
-        "🤖 **DEX Trading Bot - Help**\n\n"
-        "This bot executes automated trades with a fixed 2×2 pattern:\n"
-        "BUY → BUY → SELL → SELL (repeating)\n\n"
-        "**Commands:**\n"
-        "/config - Set up trading parameters\n"
-        "/setpct <value> - Update trade percentage\n"
-        "/setinterval <seconds> - Update trade interval\n"
-        "/start - Start trading session\n"
-        "/stop - Stop trading session\n"
-        "/status - Show current status\n"
-        "/history [limit] - Show recent trade history (default: 10, max: 50)\n"
-        "/reset - Reset session state (clears statistics)\n"
-        "/help - Show this help message\n\n"
-        "⚠️ **Important:**\n"
-        "This bot is designed for legitimate DCA (Dollar Cost Averaging) "
-        "execution only. It trades from a single wallet and is NOT intended "
-        "for wash trading, volume manipulation, or market spoofing.\n\n"
-        "Users are responsible for compliance with all applicable laws "
-        "and regulations in their jurisdiction."
-    )
-    
-    await update.message.reply_text(help_text, parse_mode='Markdown')
+    reply(update, HELP_TEXT, parse_mode='Markdown')
 
 
-@check_authorization
 @check_rate_limit
 async def cmd_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /history command - show recent trade history."""
@@ -576,57 +812,69 @@ async def cmd_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         try:
             limit = validate_int_input(context.args[0].strip(), min_val=1, max_val=50)
         except ValueError:
-            await update.message.reply_text(
+            reply(
+                update,
                 "❌ Invalid limit. Usage: /history [limit]\n"
                 "Example: /history 20"
             )
             return
     
     # Get trades
-    trades = db.get_user_trades(user_id, limit=limit)
+    trades = await asyncio.to_thread(db.get_user_trades, user_id, limit)
     
     if not trades:
-        await update.message.reply_text("📊 No trade history found.")
+        reply(update, "📊 No trade history found.")
         return
     
-    # Format message
-    message = f"📊 Recent Trade History (Last {len(trades)} trades):\n\n"
+    # Format message as plain text; bold/code ranges are sent as entities
+    # (offsets in UTF-16 code units; everything after the header is ASCII)
+    header = f"📊 Recent Trade History (Last {len(trades)} trades):\n\n"
+    parts = [header]
+    entities = []
+    offset = _utf16_len(header)
     
     for trade in trades[:limit]:
         timestamp = trade.timestamp.strftime("%Y-%m-%d %H:%M:%S") if trade.timestamp else "N/A"
-        message += (
-            f"**{trade.side}** - {timestamp}\n"
+        entities.append(MessageEntity(MessageEntity.BOLD, offset, len(trade.side)))
+        body = (
+            f"{trade.side} - {timestamp}\n"
             f"In: {trade.amount_in:.6f}\n"
             f"Out: {trade.amount_out:.6f}\n"
-            f"TX: `{trade.tx_hash[:16]}...`\n"
+            f"TX: "
         )
+        tx_short = f"{trade.tx_hash[:16]}..."
+        entities.append(MessageEntity(MessageEntity.CODE, offset + len(body), len(tx_short)))
+        body += f"{tx_short}\n"
         if trade.execution_price:
-            message += f"Price: {trade.execution_price:.6f}\n"
-        message += "\n"
+            body += f"Price: {trade.execution_price:.6f}\n"
+        body += "\n"
+        parts.append(body)
+        offset += len(body)
     
-    await update.message.reply_text(message, parse_mode='Markdown')
+    reply(update, "".join(parts), entities=entities)
 
 
-@check_authorization
 @check_rate_limit
 async def cmd_reset(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /reset command - reset session state."""
     user_id = update.effective_user.id
     
     # Check if session is active
-    if session_runner.is_session_active(user_id):
-        await update.message.reply_text(
-            "⚠️ Cannot reset while a session is active.\n"
-            "Please /stop the session first."
-        )
+    if reply_if_session_running(
+        update,
+        user_id,
+        "⚠️ Cannot reset while a session is active.\n"
+        "Please /stop the session first."
+    ):
         return
     
     # Reset session state
     session_state = db.get_session_state(user_id)
     session_state.reset()
-    db.save_session_state(session_state)
+    await asyncio.to_thread(db.save_session_state, session_state)
     
-    await update.message.reply_text(
+    reply(
+        update,
         "✅ Session state has been reset.\n"
         "All trade statistics have been cleared."
     )
@@ -638,23 +886,23 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     logger.error(f"Update {update} caused error {context.error}")
     
     if update and update.effective_message:
-        await update.effective_message.reply_text(
+        reply(
+            update,
             "❌ An error occurred. Please try again or contact support."
         )
 
 
-def setup_signal_handlers(app: Application):
-    """Setup graceful shutdown handlers."""
-    def signal_handler(signum, frame):
-        logger.info(f"Received signal {signum}, shutting down gracefully...")
-        # Stop all active sessions
-        for user_id in list(session_runner.active_sessions.keys()):
-            session_runner.stop_session(user_id)
-        # Stop the bot
-        app.stop()
-    
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+# Commands outside the /config conversation, as (command, handler)
+COMMAND_HANDLERS = (
+    ('start', cmd_start),
+    ('stop', cmd_stop),
+    ('setpct', cmd_setpct),
+    ('setinterval', cmd_setinterval),
+    ('status', cmd_status),
+    ('history', cmd_history),
+    ('reset', cmd_reset),
+    ('help', cmd_help),
+)
 
 
 def main() -> None:
@@ -663,6 +911,14 @@ def main() -> None:
     
     logger.info("Starting DEX Trading Bot...")
     
+    # Use the libuv-based event loop when available
+    try:
+        import uvloop
+        uvloop.install()
+        logger.info("Using uvloop event loop")
+    except ImportError:
+        pass
+    
     # Initialize components
     try:
         db = Database(config.DATABASE_PATH)
@@ -679,10 +935,22 @@ def main() -> None:
         sys.exit(1)
     
     # Create application
-    application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .request(OrjsonHTTPXRequest(connection_pool_size=256))
+        .get_updates_request(OrjsonHTTPXRequest(connection_pool_size=1))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
     
-    # Setup graceful shutdown
-    setup_signal_handlers(application)
+    # Authorization gate runs before every other handler. The user filter is
+    # a set lookup; only updates that fail it reach reject_unauthorized.
+    application.add_handler(
+        MessageHandler(~filters.User(user_id=AUTHORIZED_IDS), reject_unauthorized),
+        group=-1,
+    )
     
     # Add conversation handler for /config
     config_conv_handler = ConversationHandler(
@@ -698,36 +966,31 @@ def main() -> None:
     application.add_handler(config_conv_handler)
     
     # Add command handlers
-    application.add_handler(CommandHandler('start', cmd_start))
-    application.add_handler(CommandHandler('stop', cmd_stop))
-    application.add_handler(CommandHandler('setpct', cmd_setpct))
-    application.add_handler(CommandHandler('setinterval', cmd_setinterval))
-    application.add_handler(CommandHandler('status', cmd_status))
-    application.add_handler(CommandHandler('history', cmd_history))
-    application.add_handler(CommandHandler('reset', cmd_reset))
-    application.add_handler(CommandHandler('help', cmd_help))
+    application.add_handlers([CommandHandler(name, callback) for name, callback in COMMAND_HANDLERS])
     
     # Add error handler
     application.add_error_handler(error_handler)
     
-    # Start message queue processor
-    application.job_queue.run_repeating(
-        process_message_queues,
-        interval=1,
-        first=1
-    )
-    
-    # Start bot
+    # Start bot. Only message updates are requested; the bot handles no others.
     logger.info("Bot is running...")
     try:
-        application.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
+        if config.WEBHOOK_URL:
+            # Telegram pushes updates to WEBHOOK_URL/<token>; needs the
+            # python-telegram-bot[webhooks] extra
+            application.run_webhook(
+                listen="0.0.0.0",
+                port=config.WEBHOOK_PORT,
+                url_path=config.TELEGRAM_BOT_TOKEN,
+                webhook_url=f"{config.WEBHOOK_URL.rstrip('/')}/{config.TELEGRAM_BOT_TOKEN}",
+                allowed_updates=[Update.MESSAGE],
+                drop_pending_updates=True,
+            )
+        else:
+            application.run_polling(allowed_updates=[Update.MESSAGE], drop_pending_updates=True)
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     finally:
-        # Cleanup
-        logger.info("Shutting down bot...")
-        for user_id in list(session_runner.active_sessions.keys()):
-            session_runner.stop_session(user_id)
+        # Active sessions were stopped in post_stop
         logger.info("Bot shutdown complete")
 
 
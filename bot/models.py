@@ -5,14 +5,28 @@ Defines dataclasses and database schema for session configuration and state.
 
 from dataclasses import dataclass, field
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timezone
 
 
-@dataclass
+def utcnow() -> datetime:
+    """
+    Current UTC time as a naive datetime (replaces the deprecated
+    datetime.utcnow). Naive because SQLite hands stored timestamps back
+    without an offset; every timestamp the bot creates uses this.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Fixed trading pattern: BUY -> BUY -> SELL -> SELL (repeating)
+TRADING_PATTERN = ("BUY", "BUY", "SELL", "SELL")
+
+
+@dataclass(frozen=True, slots=True)
 class SessionConfig:
     """
     Configuration for a user's trading session.
     Defines the parameters for how trades should be executed.
+    Immutable: change settings with dataclasses.replace(), which re-validates.
     """
     user_id: int
     total_liquidity: float  # Total liquidity in quote token (e.g., USDC)
@@ -21,6 +35,7 @@ class SessionConfig:
     slippage_bps: int = 50  # Slippage tolerance in basis points (50 = 0.5%)
     min_notional: float = 10.0  # Minimum quote token amount per trade
     max_position: Optional[float] = None  # Optional maximum base token position
+    _trade_amount: float = field(init=False, repr=False, compare=False)
     
     def __post_init__(self):
         """Validate configuration values."""
@@ -34,13 +49,28 @@ class SessionConfig:
             raise ValueError("slippage_bps must be between 0 and 10000")
         if self.min_notional < 0:
             raise ValueError("min_notional must be non-negative")
+        
+        # Inputs are immutable, so compute the trade size once
+        object.__setattr__(self, "_trade_amount", self.total_liquidity * (self.trade_pct / 100.0))
+    
+    @classmethod
+    def from_trusted(cls, **values) -> "SessionConfig":
+        """
+        Build a config from values that were validated when first saved
+        (database rows), skipping __post_init__ validation.
+        """
+        self = cls.__new__(cls)
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_trade_amount", self.total_liquidity * (self.trade_pct / 100.0))
+        return self
     
     def get_trade_amount(self) -> float:
-        """Calculate the quote token amount for a single trade."""
-        return self.total_liquidity * (self.trade_pct / 100.0)
+        """Quote token amount for a single trade (computed once at construction)."""
+        return self._trade_amount
 
 
-@dataclass
+@dataclass(slots=True)
 class SessionState:
     """
     Runtime state of a user's trading session.
@@ -63,8 +93,7 @@ class SessionState:
     
     def get_current_side(self) -> str:
         """Get the current trade side based on pattern_index."""
-        pattern = ["BUY", "BUY", "SELL", "SELL"]
-        return pattern[self.pattern_index % 4]
+        return TRADING_PATTERN[self.pattern_index % len(TRADING_PATTERN)]
     
     def advance_pattern(self) -> None:
         """Move to the next position in the pattern."""
@@ -83,7 +112,7 @@ class SessionState:
         self.last_error = None
 
 
-@dataclass
+@dataclass(slots=True)
 class TradeRecord:
     """
     Record of a single executed trade.
@@ -95,7 +124,7 @@ class TradeRecord:
     amount_in: float = 0.0  # Input token amount (in token units, adjusted for decimals)
     amount_out: float = 0.0  # Output token amount (in token units, adjusted for decimals)
     tx_hash: str = ""
-    timestamp: datetime = field(default_factory=datetime.utcnow)
+    timestamp: datetime = field(default_factory=utcnow)
     gas_used: Optional[int] = None
     gas_price_gwei: Optional[float] = None
     execution_price: Optional[float] = None  # Effective quote/base price for this trade
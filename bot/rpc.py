@@ -0,0 +1,265 @@
+"""
+JSON-RPC transport for the DEX client.
+Extends web3's HTTPProvider with JSON-RPC batch requests.
+"""
+
+import json
+import logging
+import statistics
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from web3 import HTTPProvider
+from web3._utils.request import DEFAULT_TIMEOUT
+from web3.exceptions import ContractLogicError, TimeExhausted
+
+logger = logging.getLogger(__name__)
+
+# Any transport-level failure (connection refused, reset, timeout, HTTP error
+# status); only some of them are retryable, see is_retryable_error
+RPC_TRANSPORT_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError)
+
+# Substrings of JSON-RPC error messages that are worth retrying (node overload
+# or a load-balanced node briefly behind the chain head)
+RETRYABLE_RPC_MESSAGES = (
+    "rate limit",
+    "too many requests",
+    "429",
+    "limit exceeded",
+    "header not found",
+    "timeout",
+    "timed out",
+)
+
+# HTTP client errors that say nothing about batching: a batch POST rejected
+# with any other 4xx is treated as the endpoint refusing batches
+NON_BATCH_HTTP_ERRORS = frozenset({401, 403, 429})
+
+# Warm-up requests per endpoint when ranking candidates by latency
+LATENCY_PROBE_SAMPLES = 3
+
+
+class BatchNotSupportedError(ValueError):
+    """Raised when the RPC endpoint does not accept JSON-RPC batch requests."""
+
+
+def _http_status(error: Exception) -> Optional[int]:
+    """HTTP status code of a failed response from either HTTP client, if any."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code
+    return None
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Return True if an RPC failure is transient and the call may succeed on retry.
+    
+    Transport failures, timeouts, HTTP 5xx and rate limits are retryable.
+    Other HTTP 4xx (bad API key, oversized request), reverts
+    (ContractLogicError), invalid params and other JSON-RPC errors are not.
+    """
+    status = _http_status(error)
+    if status is not None:
+        return status >= 500 or status == 429
+    if isinstance(error, RPC_TRANSPORT_ERRORS + (ConnectionError, TimeoutError, TimeExhausted)):
+        return True
+    if isinstance(error, ContractLogicError):
+        return False
+    if isinstance(error, ValueError):
+        message = str(error).lower()
+        return any(marker in message for marker in RETRYABLE_RPC_MESSAGES)
+    return False
+
+
+class BatchHTTPProvider(HTTPProvider):
+    """
+    HTTPProvider that can send several JSON-RPC requests in one HTTP POST.
+    
+    All threads share one requests.Session with a sized keep-alive pool
+    (web3 otherwise builds one session per thread). The adapter retries only
+    failed connects: a POST that reached the node is never re-sent, since it
+    may have been a transaction broadcast. Callers decide how to recover from
+    read timeouts and gateway errors.
+    
+    With http2=True, requests go through an httpx client instead. HTTP/2
+    multiplexes concurrent calls over one connection. This needs the optional
+    ``h2`` package; without it the provider stays on requests.
+    """
+    
+    def __init__(
+        self,
+        endpoint_uri: str,
+        request_kwargs: Optional[Dict[str, Any]] = None,
+        pool_size: int = 20,
+        http2: bool = False,
+    ) -> None:
+        super().__init__(endpoint_uri, request_kwargs)
+        self._http2_client: Optional[httpx.Client] = None
+        if http2:
+            try:
+                # Pool limits go on the transport; a Client given its own
+                # transport ignores its limits argument
+                self._http2_client = httpx.Client(
+                    transport=httpx.HTTPTransport(
+                        http2=True,
+                        retries=3,
+                        limits=httpx.Limits(
+                            max_connections=pool_size,
+                            max_keepalive_connections=pool_size,
+                        ),
+                    ),
+                )
+            except ImportError:
+                logger.warning("RPC_HTTP2 requested but the 'h2' package is missing; using HTTP/1.1")
+        
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=3,
+                connect=3,
+                read=False,
+                status=0,
+                other=0,
+                backoff_factor=0.2,
+                allowed_methods=frozenset({"POST"}),
+            ),
+        )
+        self._session = requests.Session()
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+    
+    def _post(self, data: bytes) -> bytes:
+        """POST a JSON-RPC payload through the shared HTTP/2 client or session."""
+        request_kwargs = self.get_request_kwargs()
+        request_kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+        if self._http2_client is not None:
+            response = self._http2_client.post(
+                self.endpoint_uri,
+                content=data,
+                headers=request_kwargs.get("headers"),
+                timeout=request_kwargs["timeout"],
+            )
+        else:
+            response = self._session.post(self.endpoint_uri, data=data, **request_kwargs)
+        response.raise_for_status()
+        return response.content
+    
+    def make_request(self, method, params):
+        """Send a single JSON-RPC request over the pooled session."""
+        raw_response = self._post(self.encode_rpc_request(method, params))
+        return self.decode_rpc_response(raw_response)
+    
+    def decode_rpc_response(self, raw_response: bytes) -> Dict[str, Any]:
+        """Parse a JSON-RPC response with orjson (receipts with many logs are large)."""
+        return orjson.loads(raw_response)
+    
+    def get_request_headers(self) -> Dict[str, str]:
+        """Default web3 headers plus an explicit request for gzip responses."""
+        headers = super().get_request_headers()
+        headers["Accept-Encoding"] = "gzip"
+        return headers
+    
+    def make_batch_request(self, calls: Sequence[Tuple[str, Any]]) -> List[Any]:
+        """
+        Send (method, params) pairs as one JSON-RPC batch.
+
+        Returns the raw ``result`` of each call, in the order given.
+        Nodes may answer a batch in any order, so responses are matched by id.
+        Raises BatchNotSupportedError if the endpoint refuses batches, and
+        ValueError if any call errored or is missing from the response.
+        """
+        payload = [
+            {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+            for request_id, (method, params) in enumerate(calls)
+        ]
+        try:
+            raw_response = self._post(json.dumps(payload).encode())
+        except RPC_TRANSPORT_ERRORS as e:
+            # Some nodes refuse batches (or their size) with a 4xx status
+            status = _http_status(e)
+            if status is not None and 400 <= status < 500 and status not in NON_BATCH_HTTP_ERRORS:
+                raise BatchNotSupportedError(
+                    f"RPC endpoint rejected batch request: HTTP {status}"
+                ) from e
+            raise
+        responses = orjson.loads(raw_response)
+        if not isinstance(responses, list):
+            # Nodes without batch support answer with a single error object
+            raise BatchNotSupportedError(f"RPC endpoint rejected batch request: {responses}")
+
+        by_id = {response.get("id"): response for response in responses}
+        results = []
+        for request_id, (method, _) in enumerate(calls):
+            response = by_id.get(request_id)
+            if response is None:
+                raise ValueError(f"No response for batched {method} call")
+            if "error" in response:
+                raise ValueError(f"Batched {method} call failed: {response['error']}")
+            results.append(response.get("result"))
+
+        logger.debug(f"Batched {len(calls)} RPC calls in one request")
+        return results
+
+
+@lru_cache(maxsize=8)
+def get_provider(
+    endpoint_uri: str,
+    timeout: float = DEFAULT_TIMEOUT,
+    pool_size: int = 20,
+    http2: bool = False,
+) -> BatchHTTPProvider:
+    """
+    Return the shared provider for an endpoint, creating it on first use.
+    
+    Clients built later in the process reuse its warm keep-alive
+    connections instead of opening new ones and repeating the TLS handshake.
+    """
+    return BatchHTTPProvider(
+        endpoint_uri,
+        request_kwargs={"timeout": timeout},
+        pool_size=pool_size,
+        http2=http2,
+    )
+
+
+def rank_endpoints(
+    urls: Sequence[str],
+    samples: int = LATENCY_PROBE_SAMPLES,
+    **provider_kwargs: Any
+) -> List[BatchHTTPProvider]:
+    """
+    Get the provider for each URL and order them by median eth_blockNumber latency.
+    
+    The probe requests also warm each provider's keep-alive connection.
+    Endpoints that fail the probe are dropped.
+    """
+    ranked = []
+    for url in urls:
+        provider = get_provider(url, **provider_kwargs)
+        latencies = []
+        try:
+            for _ in range(samples):
+                started = time.perf_counter()
+                response = provider.make_request("eth_blockNumber", [])
+                if "error" in response:
+                    raise ValueError(response["error"])
+                latencies.append(time.perf_counter() - started)
+        except Exception as e:
+            logger.warning(f"RPC endpoint {url} failed latency probe: {e}")
+            continue
+        
+        median = statistics.median(latencies)
+        logger.info(f"RPC endpoint {url}: median latency {median * 1000:.1f} ms")
+        ranked.append((median, provider))
+    
+    ranked.sort(key=lambda entry: entry[0])
+    return [provider for _, provider in ranked]
@@ -3,22 +3,29 @@ Session runner implementing the 2×2 trading pattern (BUY-BUY-SELL-SELL).
 Manages background execution loops for active trading sessions.
 """
 
+import asyncio
 import logging
 import time
-import queue
-from typing import Dict, Optional, Callable
-from datetime import datetime
-from threading import Thread, Lock
+from typing import Dict, Optional, Callable, Tuple
+from threading import Event, Thread, Lock, current_thread
 
 from .config import config
-from .models import SessionConfig, SessionState, TradeRecord
+from .models import SessionConfig, SessionState, TradeRecord, utcnow
 from .dex_client import DexClient
 from .db import Database
 
 logger = logging.getLogger(__name__)
 
-# Fixed trading pattern: BUY -> BUY -> SELL -> SELL (repeating)
-TRADING_PATTERN = ["BUY", "BUY", "SELL", "SELL"]
+# Notification sent after each completed trade, filled with %-formatting
+TRADE_MESSAGE = "✅ %s completed:\nIn: %.6f\nOut: %.6f\nTX: %s...\nTrades: %d"
+
+# Trades between on-chain balance reads in a session loop (one full pattern
+# cycle); in between, balances are updated from each swap's amounts
+BALANCE_REFRESH_TRADES = 4
+
+# Number of locks guarding session state; users share them by user_id, which
+# keeps the lock count fixed however many users come and go (power of two)
+SESSION_LOCK_STRIPES = 64
 
 
 class SessionRunner:
@@ -38,34 +45,44 @@ class SessionRunner:
         self.db = db
         self.dex_client = dex_client
         self.active_sessions: Dict[int, Thread] = {}
-        self.session_locks: Dict[int, Lock] = {}
-        self.message_callbacks: Dict[int, Callable] = {}
-        self.message_queues: Dict[int, queue.Queue] = {}
+        # Immutable copy of active_sessions' keys, replaced whenever membership
+        # changes; readers use it without a lock or racing the loop's cleanup
+        self._active_snapshot: Tuple[int, ...] = ()
+        # Serializes session start (check and registration), cleanup, and the
+        # snapshot rebuild
+        self._registry_lock = Lock()
+        self._lock_stripes = [Lock() for _ in range(SESSION_LOCK_STRIPES)]
+        # Set by stop_session; the loop checks it without touching session state
+        self.stop_flags: Dict[int, Event] = {}
+        # Event loop and callback that deliver notifications from session threads
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._deliver: Optional[Callable[[int, str], None]] = None
         self._shutdown_event = None
         
         logger.info("SessionRunner initialized")
     
-    def register_message_callback(self, user_id: int, callback: Callable) -> None:
+    def attach_loop(self, loop: asyncio.AbstractEventLoop, deliver: Callable[[int, str], None]) -> None:
         """
-        Register a callback function to send messages to a user.
+        Route session notifications to an event loop.
         
         Args:
-            user_id: Telegram user ID
-            callback: Async function that takes a message string
+            loop: The bot's running event loop
+            deliver: Plain (non-async) function taking (user_id, message),
+                called on the loop thread for every notification
         """
-        self.message_callbacks[user_id] = callback
-        # Create message queue for this user
-        if user_id not in self.message_queues:
-            self.message_queues[user_id] = queue.Queue()
+        self._loop = loop
+        self._deliver = deliver
     
-    async def send_user_message(self, user_id: int, message: str) -> None:
-        """Send a message to a user via registered callback."""
-        callback = self.message_callbacks.get(user_id)
-        if callback:
-            try:
-                await callback(message)
-            except Exception as e:
-                logger.error(f"Failed to send message to user {user_id}: {e}")
+    def _notify(self, user_id: int, message: str) -> None:
+        """Hand a message for a user to the event loop (safe from any thread)."""
+        if self._loop is None:
+            logger.debug(f"No event loop attached; dropping message for user {user_id}")
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, user_id, message)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            logger.warning(f"Dropping message for user {user_id}: event loop closed")
     
     def start_session(self, user_id: int) -> bool:
         """
@@ -77,40 +94,44 @@ class SessionRunner:
         Returns:
             True if session started, False if already running or config missing
         """
-        # Check if already running
-        if user_id in self.active_sessions and self.active_sessions[user_id].is_alive():
-            logger.warning(f"Session already running for user {user_id}")
-            return False
-        
-        # Load configuration
-        session_config = self.db.get_session_config(user_id)
-        if not session_config:
-            logger.error(f"No configuration found for user {user_id}")
-            return False
-        
-        # Load or create state
-        session_state = self.db.get_session_state(user_id)
-        
-        # Reset state for new session if it was stopped
-        if not session_state.active:
-            session_state.reset()
-        
-        session_state.active = True
-        session_state.started_at = datetime.utcnow()
-        self.db.save_session_state(session_state)
-        
-        # Create lock for this session
-        if user_id not in self.session_locks:
-            self.session_locks[user_id] = Lock()
-        
-        # Start background thread
-        thread = Thread(
-            target=self._run_session_loop,
-            args=(user_id, session_config, session_state),
-            daemon=True
-        )
-        thread.start()
-        self.active_sessions[user_id] = thread
+        # The running check, state update and registration share one critical
+        # section, so two concurrent starts cannot both spawn a loop. The
+        # thread starts inside it too: an unstarted thread is not alive.
+        with self._registry_lock:
+            existing = self.active_sessions.get(user_id)
+            if existing is not None and existing.is_alive():
+                logger.warning(f"Session already running for user {user_id}")
+                return False
+            
+            # Load configuration
+            session_config = self.db.get_session_config(user_id)
+            if not session_config:
+                logger.error(f"No configuration found for user {user_id}")
+                return False
+            
+            # Load or create state
+            session_state = self.db.get_session_state(user_id)
+            
+            # Reset state for new session if it was stopped
+            if not session_state.active:
+                session_state.reset()
+            
+            session_state.active = True
+            session_state.started_at = utcnow()
+            self.db.save_session_state(session_state)
+            
+            # Start background thread, registered first so the loop's cleanup
+            # always finds its entry
+            stop_flag = Event()
+            thread = Thread(
+                target=self._run_session_loop,
+                args=(user_id, session_config, session_state, stop_flag),
+                daemon=True
+            )
+            self.stop_flags[user_id] = stop_flag
+            self.active_sessions[user_id] = thread
+            self._active_snapshot = tuple(self.active_sessions)
+            thread.start()
         
         logger.info(f"Started trading session for user {user_id}")
         return True
@@ -125,29 +146,49 @@ class SessionRunner:
         Returns:
             True if session was stopped, False if not running
         """
-        # Mark as inactive in database
-        session_state = self.db.get_session_state(user_id)
-        if not session_state.active:
+        if not self._finalize_stop(user_id, only_if_active=True):
             logger.warning(f"No active session for user {user_id}")
             return False
         
-        session_state.active = False
-        session_state.stopped_at = datetime.utcnow()
-        self.db.save_session_state(session_state)
-        
         logger.info(f"Stopped trading session for user {user_id}")
         return True
     
+    def _session_lock(self, user_id: int) -> Lock:
+        """
+        Lock serializing read-modify-write of a user's session state.
+        Held only around state reads and writes, never across RPC calls.
+        Users whose IDs share a stripe also share the lock.
+        """
+        return self._lock_stripes[user_id & (SESSION_LOCK_STRIPES - 1)]
+    
+    def _running_stop_flag(self, user_id: int) -> Optional[Event]:
+        """Stop flag of a user's running session loop, or None if none is running."""
+        if user_id not in self._active_snapshot:
+            return None
+        # Cleanup drops the snapshot entry before the flag, so a missing flag
+        # here means the loop has just ended
+        return self.stop_flags.get(user_id)
+    
     def is_session_active(self, user_id: int) -> bool:
-        """Check if a user has an active trading session."""
-        session_state = self.db.get_session_state(user_id)
-        return session_state.active
+        """Check if a user has a running trading session that was not asked to stop."""
+        stop_flag = self._running_stop_flag(user_id)
+        return stop_flag is not None and not stop_flag.is_set()
+    
+    def is_session_stopping(self, user_id: int) -> bool:
+        """Check if a user's session was stopped but its loop is still finishing a trade."""
+        stop_flag = self._running_stop_flag(user_id)
+        return stop_flag is not None and stop_flag.is_set()
+    
+    def active_user_ids(self) -> Tuple[int, ...]:
+        """Return the IDs of users with a running session loop."""
+        return self._active_snapshot
     
     def _run_session_loop(
         self,
         user_id: int,
         session_config: SessionConfig,
-        session_state: SessionState
+        session_state: SessionState,
+        stop_flag: Event
     ) -> None:
         """
         Main trading loop for a session (runs in background thread).
@@ -158,199 +199,254 @@ class SessionRunner:
         It trades from a single wallet and executes legitimate buy/sell orders.
         """
         logger.info(f"Session loop started for user {user_id}")
+        trade_notional = session_config.get_trade_amount()
+        
+        # Wallet balances, re-read on-chain every BALANCE_REFRESH_TRADES trades
+        # and otherwise carried forward from each swap's amounts
+        balances = None
+        trades_since_refresh = 0
         
         try:
-            while True:
-                # Check if session is still active
-                with self.session_locks[user_id]:
+            while not stop_flag.is_set():
+                # Trades start interval_seconds apart; time spent on RPCs
+                # comes out of the wait instead of adding to it
+                next_trade_at = time.monotonic() + session_config.interval_seconds
+                
+                # Read the session's progress. The lock covers only this read
+                # and the state update after a trade, so /stop never waits on
+                # an RPC call.
+                with self._session_lock(user_id):
                     current_state = self.db.get_session_state(user_id)
-                    if not current_state.active:
-                        logger.info(f"Session stopped for user {user_id}")
-                        break
-                    
-                    # Check max trades limit
-                    if current_state.trades_executed >= config.MAX_TRADES_PER_SESSION:
-                        logger.info(f"Max trades reached for user {user_id}")
-                        self._stop_with_message(
-                            user_id,
-                            f"⛔ Session stopped: Maximum trades ({config.MAX_TRADES_PER_SESSION}) reached."
-                        )
-                        break
-                    
-                    # Get current trade side from pattern
-                    side = TRADING_PATTERN[current_state.pattern_index % 4]
-                    trade_notional = session_config.get_trade_amount()
-                    
-                    # Check minimum notional
-                    if trade_notional < session_config.min_notional:
-                        logger.error(f"Trade size below minimum for user {user_id}")
-                        self._stop_with_message(
-                            user_id,
-                            f"⛔ Session stopped: Trade size ({trade_notional:.2f}) "
-                            f"below minimum ({session_config.min_notional:.2f})."
-                        )
-                        break
-                    
-                    # Get current balances
-                    try:
+                
+                # Check if session is still active (also covers a stop
+                # written to the database without the flag)
+                if not current_state.active:
+                    logger.info(f"Session stopped for user {user_id}")
+                    break
+                
+                # Check max trades limit
+                if current_state.trades_executed >= config.MAX_TRADES_PER_SESSION:
+                    logger.info(f"Max trades reached for user {user_id}")
+                    self._stop_with_message(
+                        user_id,
+                        f"⛔ Session stopped: Maximum trades ({config.MAX_TRADES_PER_SESSION}) reached."
+                    )
+                    break
+                
+                # Get current trade side from pattern
+                side = current_state.get_current_side()
+                
+                # Check minimum notional
+                if trade_notional < session_config.min_notional:
+                    logger.error(f"Trade size below minimum for user {user_id}")
+                    self._stop_with_message(
+                        user_id,
+                        f"⛔ Session stopped: Trade size ({trade_notional:.2f}) "
+                        f"below minimum ({session_config.min_notional:.2f})."
+                    )
+                    break
+                
+                # Get current balances. Another session trading from the same
+                # wallet would make carried-forward balances stale, so always
+                # re-read them when more than one session is running.
+                try:
+                    if (
+                        balances is None
+                        or trades_since_refresh >= BALANCE_REFRESH_TRADES
+                        or len(self._active_snapshot) > 1
+                    ):
                         balances = self.dex_client.get_balances()
-                    except Exception as e:
-                        logger.error(f"Failed to get balances: {e}")
-                        self._stop_with_error(user_id, f"Failed to get balances: {str(e)}")
-                        break
-                    
-                    # Execute trade based on side
-                    try:
-                        if side == "BUY":
-                            # Check if we have enough quote tokens
-                            if balances['quote'] < trade_notional:
-                                logger.error(
-                                    f"Insufficient quote balance for user {user_id}: "
-                                    f"need {trade_notional}, have {balances['quote']}"
-                                )
-                                self._stop_with_message(
-                                    user_id,
-                                    f"⛔ Session stopped: Insufficient quote token balance. "
-                                    f"Need {trade_notional:.2f}, have {balances['quote']:.2f}."
+                        trades_since_refresh = 0
+                except Exception as e:
+                    logger.error(f"Failed to get balances: {e}")
+                    self._stop_with_error(user_id, f"Failed to get balances: {str(e)}")
+                    break
+                
+                # Execute trade based on side
+                try:
+                    if side == "BUY":
+                        # Check if we have enough quote tokens
+                        if balances['quote'] < trade_notional:
+                            logger.error(
+                                f"Insufficient quote balance for user {user_id}: "
+                                f"need {trade_notional}, have {balances['quote']}"
+                            )
+                            self._stop_with_message(
+                                user_id,
+                                f"⛔ Session stopped: Insufficient quote token balance. "
+                                f"Need {trade_notional:.2f}, have {balances['quote']:.2f}."
+                            )
+                            break
+                        
+                        # Check max position if configured
+                        if session_config.max_position is not None:
+                            if balances['base'] >= session_config.max_position:
+                                logger.warning(
+                                    f"Max position reached for user {user_id}, skipping BUY"
                                 )
-                                break
-                            
-                            # Check max position if configured
-                            if session_config.max_position is not None:
-                                if balances['base'] >= session_config.max_position:
-                                    logger.warning(
-                                        f"Max position reached for user {user_id}, skipping BUY"
-                                    )
-                                    # Skip this trade and advance pattern
+                                # Skip this trade and advance pattern
+                                with self._session_lock(user_id):
+                                    current_state = self.db.get_session_state(user_id)
                                     current_state.advance_pattern()
                                     self.db.save_session_state(current_state)
-                                    time.sleep(session_config.interval_seconds)
-                                    continue
-                            
-                            # Execute BUY
-                            result = self.dex_client.swap_exact_quote_for_base(
-                                trade_notional,
-                                session_config.slippage_bps
-                            )
-                            
-                            # Update state
-                            current_state.spent_notional += result['amount_in']
-                            current_state.base_position_delta += result['amount_out']
-                            
-                        else:  # SELL
-                            # Estimate base amount needed
-                            price = self.dex_client.get_price()
-                            base_needed = trade_notional / price
-                            
-                            # Check if we have enough base tokens
-                            if balances['base'] < base_needed:
-                                logger.error(
-                                    f"Insufficient base balance for user {user_id}: "
-                                    f"need ~{base_needed:.6f}, have {balances['base']:.6f}"
-                                )
-                                self._stop_with_message(
-                                    user_id,
-                                    f"⛔ Session stopped: Insufficient base token balance. "
-                                    f"Need ~{base_needed:.6f}, have {balances['base']:.6f}."
-                                )
-                                break
-                            
-                            # Execute SELL
-                            result = self.dex_client.swap_exact_base_for_quote(
-                                trade_notional,
-                                session_config.slippage_bps
-                            )
-                            
-                            # Update state
-                            current_state.received_quote += result['amount_out']
-                            current_state.base_position_delta -= result['amount_in']
+                                if stop_flag.wait(max(0.0, next_trade_at - time.monotonic())):
+                                    break
+                                continue
                         
-                        # Record trade
-                        execution_price = (
-                            result['amount_out'] / result['amount_in']
-                            if side == "BUY"
-                            else result['amount_in'] / result['amount_out']
+                        # Execute BUY
+                        result = self.dex_client.swap_exact_quote_for_base(
+                            trade_notional,
+                            session_config.slippage_bps
                         )
                         
-                        trade_record = TradeRecord(
-                            user_id=user_id,
-                            side=side,
-                            amount_in=result['amount_in'],
-                            amount_out=result['amount_out'],
-                            tx_hash=result['tx_hash'],
-                            gas_used=result['gas_used'],
-                            gas_price_gwei=result['gas_price_gwei'],
-                            execution_price=execution_price,
-                        )
+                    else:  # SELL
+                        # Quote base amount needed; the swap reuses this quote
+                        quote = self.dex_client.quote_sell(trade_notional)
+                        base_needed = quote['amount_in']
                         
-                        self.db.save_trade_record(trade_record)
+                        # Check if we have enough base tokens
+                        if balances['base'] < base_needed:
+                            logger.error(
+                                f"Insufficient base balance for user {user_id}: "
+                                f"need ~{base_needed:.6f}, have {balances['base']:.6f}"
+                            )
+                            self._stop_with_message(
+                                user_id,
+                                f"⛔ Session stopped: Insufficient base token balance. "
+                                f"Need ~{base_needed:.6f}, have {balances['base']:.6f}."
+                            )
+                            break
                         
-                        # Update session state
+                        # Execute SELL
+                        result = self.dex_client.swap_exact_base_for_quote(
+                            trade_notional,
+                            session_config.slippage_bps,
+                            quote=quote
+                        )
+                    
+                    # Record trade
+                    execution_price = (
+                        result['amount_out'] / result['amount_in']
+                        if side == "BUY"
+                        else result['amount_in'] / result['amount_out']
+                    )
+                    
+                    trade_record = TradeRecord(
+                        user_id=user_id,
+                        side=side,
+                        amount_in=result['amount_in'],
+                        amount_out=result['amount_out'],
+                        tx_hash=result['tx_hash'],
+                        gas_used=result['gas_used'],
+                        gas_price_gwei=result['gas_price_gwei'],
+                        execution_price=execution_price,
+                    )
+                    
+                    # Apply the trade to the latest state (it may have been
+                    # stopped while the swap was in flight; keep that) and
+                    # save it together with the trade record
+                    with self._session_lock(user_id):
+                        current_state = self.db.get_session_state(user_id)
+                        if side == "BUY":
+                            current_state.spent_notional += result['amount_in']
+                            current_state.base_position_delta += result['amount_out']
+                        else:
+                            current_state.received_quote += result['amount_out']
+                            current_state.base_position_delta -= result['amount_in']
                         current_state.trades_executed += 1
                         current_state.advance_pattern()
                         current_state.last_error = None
-                        self.db.save_session_state(current_state)
-                        
-                        # Notify user via queue (to avoid asyncio.run() in thread)
-                        message = (
-                            f"✅ {side} completed:\n"
-                            f"In: {result['amount_in']:.6f}\n"
-                            f"Out: {result['amount_out']:.6f}\n"
-                            f"TX: {result['tx_hash'][:16]}...\n"
-                            f"Trades: {current_state.trades_executed}"
-                        )
-                        if user_id in self.message_queues:
-                            try:
-                                self.message_queues[user_id].put_nowait(message)
-                            except queue.Full:
-                                logger.warning(f"Message queue full for user {user_id}")
-                        
-                    except Exception as e:
-                        logger.error(f"Trade execution failed for user {user_id}: {e}")
-                        self._stop_with_error(user_id, f"Trade failed: {str(e)}")
-                        break
+                        self.db.save_trade_and_state(trade_record, current_state)
+                    
+                    # Carry the balances forward by the swap's actual amounts
+                    if side == "BUY":
+                        balances['quote'] -= result['amount_in']
+                        balances['base'] += result['amount_out']
+                    else:
+                        balances['base'] -= result['amount_in']
+                        balances['quote'] += result['amount_out']
+                    trades_since_refresh += 1
+                    
+                    # Notify user on the event loop (to avoid asyncio.run() in thread)
+                    message = TRADE_MESSAGE % (
+                        side,
+                        result['amount_in'],
+                        result['amount_out'],
+                        result['tx_hash'][:16],
+                        current_state.trades_executed,
+                    )
+                    self._notify(user_id, message)
+                    
+                except Exception as e:
+                    logger.error(f"Trade execution failed for user {user_id}: {e}")
+                    self._stop_with_error(user_id, f"Trade failed: {str(e)}")
+                    break
                 
-                # Wait for next trade interval
-                logger.debug(f"Sleeping for {session_config.interval_seconds}s")
-                time.sleep(session_config.interval_seconds)
+                # Wait for next trade interval; /stop wakes the wait immediately
+                wait_seconds = max(0.0, next_trade_at - time.monotonic())
+                logger.debug(f"Sleeping for {wait_seconds:.2f}s")
+                if stop_flag.wait(wait_seconds):
+                    logger.info(f"Session stopped for user {user_id}")
+                    break
                 
         except Exception as e:
             logger.error(f"Unexpected error in session loop for user {user_id}: {e}")
             self._stop_with_error(user_id, f"Unexpected error: {str(e)}")
         
         finally:
-            # Cleanup
-            if user_id in self.active_sessions:
-                del self.active_sessions[user_id]
+            # Cleanup; a new session may already have replaced this thread's entries
+            with self._registry_lock:
+                if self.active_sessions.get(user_id) is current_thread():
+                    del self.active_sessions[user_id]
+                    self._active_snapshot = tuple(self.active_sessions)
+                if self.stop_flags.get(user_id) is stop_flag:
+                    del self.stop_flags[user_id]
             logger.info(f"Session loop ended for user {user_id}")
     
+    def _finalize_stop(
+        self,
+        user_id: int,
+        message: Optional[str] = None,
+        error: Optional[str] = None,
+        only_if_active: bool = False
+    ) -> bool:
+        """
+        Mark a session stopped in one state read-modify-write, wake its loop,
+        and optionally notify the user.
+        
+        Args:
+            user_id: Telegram user ID
+            message: Notification to send once the state is saved
+            error: Stored as the state's last_error when given
+            only_if_active: Leave the state untouched if it is not active
+        
+        Returns:
+            False if only_if_active was set and the session was not active
+        """
+        with self._session_lock(user_id):
+            session_state = self.db.get_session_state(user_id)
+            if only_if_active and not session_state.active:
+                return False
+            
+            session_state.active = False
+            session_state.stopped_at = utcnow()
+            if error is not None:
+                session_state.last_error = error
+            self.db.save_session_state(session_state)
+        
+        stop_flag = self.stop_flags.get(user_id)
+        if stop_flag is not None:
+            stop_flag.set()
+        
+        # Hand the message to the event loop instead of using asyncio.run()
+        if message is not None:
+            self._notify(user_id, message)
+        return True
+    
     def _stop_with_message(self, user_id: int, message: str) -> None:
         """Stop session and send message to user."""
-        session_state = self.db.get_session_state(user_id)
-        session_state.active = False
-        session_state.stopped_at = datetime.utcnow()
-        self.db.save_session_state(session_state)
-        
-        # Queue message instead of using asyncio.run()
-        if user_id in self.message_queues:
-            try:
-                self.message_queues[user_id].put_nowait(message)
-            except queue.Full:
-                logger.warning(f"Message queue full for user {user_id}")
+        self._finalize_stop(user_id, message)
     
     def _stop_with_error(self, user_id: int, error: str) -> None:
         """Stop session due to error and notify user."""
-        session_state = self.db.get_session_state(user_id)
-        session_state.active = False
-        session_state.stopped_at = datetime.utcnow()
-        session_state.last_error = error
-        self.db.save_session_state(session_state)
-        
-        # Queue message instead of using asyncio.run()
-        message = f"❌ Session stopped due to error:\n{error}"
-        if user_id in self.message_queues:
-            try:
-                self.message_queues[user_id].put_nowait(message)
-            except queue.Full:
-                logger.warning(f"Message queue full for user {user_id}")
-    
+        self._finalize_stop(user_id, f"❌ Session stopped due to error:\n{error}", error=error)
@@ -0,0 +1,48 @@
+"""
+Validate .env files against the bot's configuration schema.
+
+Runs the same checks as bot.config.Config.from_env (required keys, addresses,
+private key, Telegram IDs, paths) without starting the bot, so broken
+configuration is caught in CI / pre-commit instead of at deploy time.
+Nothing is written: the database directory is not created.
+
+Usage:
+    python tools/validate_env.py [.env] [.env.example ...]
+"""
+
+import os
+import sys
+
+from dotenv import dotenv_values
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.config import Config  # noqa: E402
+
+
+def validate_file(path: str) -> bool:
+    """Validate a single env file. Returns True if it is valid."""
+    if not os.path.exists(path):
+        print(f"{path}: file not found")
+        return False
+    
+    values = {key: value for key, value in dotenv_values(path).items() if value is not None}
+    try:
+        Config.from_env(values, create_dirs=False)
+    except ValueError as e:
+        print(f"{path}: {e}")
+        return False
+    
+    print(f"{path}: OK")
+    return True
+
+
+def main(argv: list) -> int:
+    """Validate every given file (default: .env) and return an exit code."""
+    paths = argv or [".env"]
+    results = [validate_file(path) for path in paths]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))